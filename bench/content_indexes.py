@@ -0,0 +1,157 @@
+"""Flask content DB read latency without and with the content indexes (migration 3).
+
+Builds a temporary SQLite DB at a given size (default 1M choices), deliberately without the
+ix_* indexes, as a live DB that has not run migration 3 would be. It measures the hot read
+endpoints through Flask's test client, applies the pending migrations with migrate_db() like
+a deploy would, and measures again:
+
+    python bench/content_indexes.py --choices 1000000 --out bench/results/indexes.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+INDEX_MIGRATION = 3
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--choices", type=int, default=1_000_000)
+    p.add_argument("--stories", type=int, default=10_000)
+    p.add_argument("--choices-per-page", type=int, default=2)
+    p.add_argument("--published", type=float, default=0.2, help="share of published stories")
+    p.add_argument("--requests", type=int, default=50, help="requests per endpoint and phase")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", default="")
+    return p.parse_args(argv)
+
+
+def build(db, args, rng):
+    """Bulk-load stories, pages and choices with plain executemany (no ORM, no FTS triggers)."""
+    pages_per_story = max(1, args.choices // (args.stories * args.choices_per_page))
+    conn = db.engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN")  # one transaction; the connection may be in driver autocommit (SQLITE_PRODUCTION_MODE)
+        cur.executemany(
+            "INSERT INTO stories (id, title, description, status, version, updated_at) VALUES (?, ?, '', ?, 1, CURRENT_TIMESTAMP)",
+            ((sid, f"Story {sid}", "published" if rng.random() < args.published else "draft") for sid in range(1, args.stories + 1)),
+        )
+        page_id = choice_id = 0
+        for sid in range(1, args.stories + 1):
+            first = page_id + 1
+            pages, choices = [], []
+            for _ in range(pages_per_story):
+                page_id += 1
+                ending = page_id - first == pages_per_story - 1
+                pages.append((page_id, sid, f"Page {page_id}", ending))
+                if not ending:
+                    for _ in range(args.choices_per_page):
+                        choice_id += 1
+                        sign = rng.choice("+-")
+                        choices.append((choice_id, page_id, f"Go on ({sign}1)", rng.randint(page_id + 1, first + pages_per_story - 1), int(f"{sign}1")))
+            cur.executemany("INSERT INTO pages (id, story_id, text, is_ending) VALUES (?, ?, ?, ?)", pages)
+            cur.executemany("INSERT INTO choices (id, page_id, text, next_page_id, score_delta) VALUES (?, ?, ?, ?, ?)", choices)
+        cur.execute("UPDATE stories SET start_page_id = (SELECT MIN(id) FROM pages WHERE pages.story_id = stories.id)")
+        conn.commit()
+    finally:
+        conn.close()
+    return page_id, choice_id
+
+
+def timed(client, url: str) -> float:
+    started = time.perf_counter()
+    r = client.get(url)
+    elapsed = (time.perf_counter() - started) * 1000.0
+    assert r.status_code == 200, (url, r.status_code)
+    return elapsed
+
+
+def measure(client, urls: dict, rng_seed: int, n: int) -> dict:
+    out = {}
+    for name, make_url in urls.items():
+        rng = random.Random(rng_seed)  # same URL sequence in both phases
+        lat = sorted(timed(client, make_url(rng)) for _ in range(n))
+        out[name] = {"p50_ms": round(lat[len(lat) // 2], 3), "p95_ms": round(lat[int(len(lat) * 0.95) - 1], 3), "max_ms": round(lat[-1], 3)}
+    return out
+
+
+def query_plans(db, story_id: int) -> dict:
+    queries = {
+        "pages of a story": f"SELECT * FROM pages WHERE story_id = {story_id} ORDER BY id",
+        "choices of a story": f"SELECT * FROM choices WHERE page_id IN (SELECT id FROM pages WHERE story_id = {story_id}) ORDER BY id",
+        "incoming choices": "SELECT * FROM choices WHERE next_page_id = 1",
+        "published listing": "SELECT * FROM stories WHERE status = 'published' AND id > 100 ORDER BY id LIMIT 21",
+    }
+    return {
+        name: " / ".join(row[3] for row in db.session.execute(db.text(f"EXPLAIN QUERY PLAN {sql}")))
+        for name, sql in queries.items()
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    tmp = tempfile.mkdtemp(prefix="nahb-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/content.db"
+    sys.path.insert(0, str(ROOT / "flask_api"))
+    import app as flask_app
+    from app import app, db, MIGRATIONS, migrate_db
+
+    flask_app.init_db.initialized = True  # the benchmark runs migrations itself
+    with app.app_context():
+        db.create_all()
+        for index in ("ix_pages_story_id", "ix_choices_page_id", "ix_choices_next_page_id", "ix_stories_status"):
+            db.session.execute(db.text(f"DROP INDEX IF EXISTS {index}"))
+        db.session.execute(db.text(
+            "CREATE TABLE schema_migrations (version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at DATETIME NOT NULL)"
+        ))
+        for version, name, _ in MIGRATIONS:
+            if version < INDEX_MIGRATION:
+                db.session.execute(db.text("INSERT INTO schema_migrations VALUES (:v, :n, CURRENT_TIMESTAMP)"), {"v": version, "n": name})
+        db.session.commit()
+
+        started = time.perf_counter()
+        pages, choices = build(db, args, rng)
+        print(f"Loaded {args.stories} stories, {pages} pages, {choices} choices in {time.perf_counter() - started:.1f}s")
+        published = [r[0] for r in db.session.execute(db.text("SELECT id FROM stories WHERE status = 'published'"))]
+
+        client = app.test_client()
+        urls = {
+            "GET /stories/<id>/pages": lambda r: f"/stories/{r.randint(1, args.stories)}/pages",
+            "GET /stories/<id>/bundle": lambda r: f"/stories/{r.randint(1, args.stories)}/bundle",
+            "GET /stories?status=published&limit=20": lambda r: f"/stories?status=published&limit=20&after_id={r.choice(published)}",
+            "GET /pages?ids=<20 ids>": lambda r: "/pages?ids=" + ",".join(str(r.randint(1, pages)) for _ in range(20)),
+        }
+        if args.stories <= 20_000:
+            urls["GET /stories?status=published (all)"] = lambda r: "/stories?status=published"
+
+        result = {"config": vars(args), "pages": pages, "choices": choices}
+        result["before"] = {"plans": query_plans(db, 1), "latency": measure(client, urls, args.seed, args.requests)}
+        started = time.perf_counter()
+        applied = migrate_db()
+        result["migration"] = {"applied": applied, "seconds": round(time.perf_counter() - started, 2)}
+        result["after"] = {"plans": query_plans(db, 1), "latency": measure(client, urls, args.seed, args.requests)}
+
+    print(f"Migrations {applied} applied in {result['migration']['seconds']}s")
+    print(f"{'endpoint':<42}{'before p50':>12}{'after p50':>12}{'before p95':>12}{'after p95':>12}")
+    for name in urls:
+        b, a = result["before"]["latency"][name], result["after"]["latency"][name]
+        print(f"{name:<42}{b['p50_ms']:>12}{a['p50_ms']:>12}{b['p95_ms']:>12}{a['p95_ms']:>12}")
+    for name, plan in result["after"]["plans"].items():
+        print(f"{name}: {result['before']['plans'][name]}  ->  {plan}")
+
+    out = Path(args.out) if args.out else ROOT / "bench" / "results" / f"content_indexes-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
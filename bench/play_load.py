@@ -0,0 +1,299 @@
+"""Concurrent-player load test for the Django play views against a throwaway Flask content DB.
+
+Starts the Flask app in-process on a temporary SQLite DB (or uses --flask-url), imports synthetic
+stories through POST /stories/import, then lets N simulated readers play them end to end through
+the real Django stack (middleware, views, templates) with django.test.Client:
+play_start -> play_page (GET) -> roll when a page is gated -> choose -> ... -> ending.
+
+Reports throughput, p50/p95/p99 latency and SQL queries per view, and Flask calls per move,
+and writes everything to a JSON file so runs can be compared:
+
+    python bench/play_load.py --pages 1000 --readers 8 --plays 5 --out bench/results/baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+CHOICE_RE = re.compile(r'name="choice_id" value="(\d+)"')
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--stories", type=int, default=3, help="synthetic stories to seed")
+    p.add_argument("--pages", type=int, default=200, help="pages per story (10 - 100000)")
+    p.add_argument("--depth", type=int, default=12, help="moves from the start page to an ending")
+    p.add_argument("--branching", type=int, default=3, help="choices per non-ending page")
+    p.add_argument("--gated", type=float, default=0.2, help="share of extra choices gated by [roll>=N]")
+    p.add_argument("--readers", type=int, default=8, help="concurrent simulated readers")
+    p.add_argument("--plays", type=int, default=5, help="complete plays per reader")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--flask-url", default="", help="use a running Flask API instead of an in-process one")
+    p.add_argument("--api-key", default=os.getenv("API_KEY", ""))
+    p.add_argument("--out", default="", help="JSON results file (default bench/results/play_load-<time>.json)")
+    args = p.parse_args(argv)
+    if not 10 <= args.pages <= 100_000:
+        p.error("--pages must be between 10 and 100000")
+    args.depth = max(1, min(args.depth, args.pages - 1))
+    return args
+
+
+def synthetic_story(n: int, pages: int, depth: int, branching: int, gated: float, rng: random.Random) -> dict:
+    """Layered DAG: every page in layer d links to pages in layer d+1, the last layer is all endings.
+
+    The first choice of every page is never gated, so every play can reach an ending.
+    """
+    layers = [[] for _ in range(depth + 1)]
+    layers[0].append(0)
+    for i in range(1, pages):
+        layers[1 + (i - 1) % depth].append(i)
+    page_rows, choices = [], []
+    for d, layer in enumerate(layers):
+        for i in layer:
+            ending = d == depth
+            page_rows.append({
+                "key": f"p{i}",
+                "text": f"Synthetic page {i} (layer {d}). " + "Lorem ipsum dolor sit amet. " * 8,
+                "is_ending": ending,
+                "ending_label": f"Ending {i % 5}" if ending else None,
+            })
+            if ending:
+                continue
+            for k, target in enumerate(rng.sample(layers[d + 1], min(branching, len(layers[d + 1])))):
+                tag = f" [roll>={rng.randint(2, 6)}]" if k and rng.random() < gated else ""
+                choices.append({"page": f"p{i}", "next_page": f"p{target}", "text": f"Go to {target} ({rng.choice('+-')}1){tag}"})
+    return {
+        "story": {"title": f"Bench story {n}", "description": f"{pages} pages, depth {depth}", "status": "published"},
+        "pages": page_rows,
+        "choices": choices,
+        "start_page": "p0",
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_flask(tmp: str) -> str:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/content.db"
+    sys.path.insert(0, str(ROOT / "flask_api"))
+    import app as flask_app
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no access log per request
+    port = free_port()
+    server = make_server("127.0.0.1", port, flask_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{port}"
+
+
+def seed(flask_url: str, args) -> list:
+    import requests
+
+    headers = {"X-API-KEY": args.api_key} if args.api_key else {}
+    rng = random.Random(args.seed)
+    ids = []
+    for n in range(args.stories):
+        data = synthetic_story(n, args.pages, args.depth, args.branching, args.gated, rng)
+        r = requests.post(f"{flask_url}/stories/import", json=data, headers=headers, timeout=600)
+        r.raise_for_status()
+        ids.append(r.json()["story"]["id"])
+    return ids
+
+
+def setup_django(tmp: str, flask_url: str):
+    os.environ["FLASK_API_BASE"] = flask_url
+    os.environ.setdefault("DEBUG", "0")  # DEBUG keeps every SQL statement in memory
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "nahb_web.settings")
+    sys.path.insert(0, str(ROOT / "django_web"))
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = f"{tmp}/django.sqlite3"
+    django.setup()
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values) + 0.5) - 1))]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(list)  # view -> [ms]
+        self.queries = defaultdict(list)  # view -> [SQL statements]
+        self.errors = defaultdict(int)
+        self.failures = defaultdict(int)  # error -> aborted plays
+        self.moves = 0
+        self.plays = 0
+
+    def add(self, view: str, ms: float, queries: int, ok: bool):
+        with self.lock:
+            self.latency[view].append(ms)
+            self.queries[view].append(queries)
+            if not ok:
+                self.errors[view] += 1
+
+
+def reader(user, story_ids: list, args, rec: Recorder, rng: random.Random):
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    client.force_login(user)
+
+    def call(method, url, view, data=None):
+        count = [0]
+
+        def counter(execute, sql, params, many, context):
+            count[0] += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(counter):
+                r = client.post(url, data) if method == "POST" else client.get(url)
+            ok = r.status_code < 400
+        except Exception as e:
+            r, ok = e, False
+        rec.add(view, (time.perf_counter() - started) * 1000.0, count[0], ok)
+        if not ok:
+            raise RuntimeError(f"{method} {url} failed: {getattr(r, 'status_code', None) or repr(r)}")
+        return r
+
+    def play(story_id):
+        r = call("GET", f"/play/{story_id}/start/", "play_start")
+        url = r["Location"]
+        while True:
+            r = call("GET", url, "play_page GET")
+            html = r.content.decode()
+            if 'value="roll"' in html:
+                call("POST", url, "play_page roll", {"action": "roll"})
+                html = call("GET", url, "play_page GET").content.decode()
+            choice_ids = CHOICE_RE.findall(html)
+            if not choice_ids:
+                raise RuntimeError(f"no choices on {url}")
+            r = call("POST", url, "play_page choose", {"action": "choose", "choice_id": rng.choice(choice_ids)})
+            with rec.lock:
+                rec.moves += 1
+            if r.status_code == 200:  # ending page is rendered directly
+                return
+            url = r["Location"]
+
+    try:
+        for _ in range(args.plays):
+            try:
+                play(rng.choice(story_ids))
+            except RuntimeError as e:
+                # An error ends this play only; the failure is counted and the reader starts the next one.
+                with rec.lock:
+                    rec.failures[str(e).split(" failed: ")[-1]] += 1
+            else:
+                with rec.lock:
+                    rec.plays += 1
+    finally:
+        connection.close()
+
+
+def flask_call_totals() -> dict:
+    from nahb_web.game.services import get_client
+
+    return {k: v["count"] for k, v in get_client().latency_stats().items()}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tmp = tempfile.mkdtemp(prefix="nahb-bench-")
+    flask_url = args.flask_url.rstrip("/") or start_flask(tmp)
+
+    started = time.perf_counter()
+    story_ids = seed(flask_url, args)
+    seed_s = time.perf_counter() - started
+    print(f"Seeded {args.stories} stories x {args.pages} pages in {seed_s:.1f}s ({flask_url})")
+
+    setup_django(tmp, flask_url)
+    from django.contrib.auth.models import User
+
+    users = [User.objects.create_user(f"reader{i}", password="bench") for i in range(args.readers)]
+    rec = Recorder()
+    before = flask_call_totals()
+    threads = [
+        threading.Thread(target=reader, args=(u, story_ids, args, rec, random.Random(args.seed * 1000 + i)))
+        for i, u in enumerate(users)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    after = flask_call_totals()
+    flask_calls = {k: after[k] - before.get(k, 0) for k in after if after[k] - before.get(k, 0)}
+
+    requests_total = sum(len(v) for v in rec.latency.values())
+    views = {}
+    for view, values in sorted(rec.latency.items()):
+        lat, q = sorted(values), sorted(rec.queries[view])
+        views[view] = {
+            "requests": len(lat),
+            "errors": rec.errors[view],
+            "p50_ms": round(percentile(lat, 50), 2),
+            "p95_ms": round(percentile(lat, 95), 2),
+            "p99_ms": round(percentile(lat, 99), 2),
+            "max_ms": round(lat[-1], 2),
+            "sql_queries_avg": round(sum(q) / len(q), 2),
+            "sql_queries_max": q[-1],
+        }
+    try:
+        git_rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        git_rev = ""
+    result = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("api_key", "out")},
+        "git_rev": git_rev,
+        "seed_seconds": round(seed_s, 2),
+        "elapsed_seconds": round(elapsed, 2),
+        "requests": requests_total,
+        "requests_per_second": round(requests_total / elapsed, 1) if elapsed else 0.0,
+        "plays_completed": rec.plays,
+        "moves": rec.moves,
+        "flask_calls": flask_calls,
+        "flask_calls_per_move": round(sum(flask_calls.values()) / rec.moves, 3) if rec.moves else 0.0,
+        "views": views,
+        "plays_failed": dict(rec.failures),
+    }
+
+    print(f"{requests_total} requests in {elapsed:.1f}s = {result['requests_per_second']} req/s, "
+          f"{rec.plays} plays, {rec.moves} moves, {result['flask_calls_per_move']} Flask calls/move")
+    print(f"{'view':<20}{'n':>7}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'sql':>7}")
+    for view, v in views.items():
+        print(f"{view:<20}{v['requests']:>7}{v['errors']:>5}{v['p50_ms']:>9}{v['p95_ms']:>9}{v['p99_ms']:>9}{v['sql_queries_avg']:>7}")
+    for error, n in rec.failures.items():
+        print(f"{n} plays aborted by: {error}")
+
+    out = Path(args.out) if args.out else ROOT / "bench" / "results" / f"play_load-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Concurrent writer stress test for both SQLite databases, with and without SQLITE_PRODUCTION_MODE.
+
+Spawns --processes worker processes (like gunicorn workers) that together issue --rate writes/s
+for --seconds against a temporary Django DB and Flask content DB. Each worker cycles through the
+writes the apps do under load:
+
+    session  PlaySession update_or_create (read, then write)
+    play     stats.record_play: Play + rollups + route index in one transaction
+    rating   Rating update_or_create
+    story    Flask PUT /stories/<id> (read, then write)
+
+and reports achieved writes/s, latency and "database is locked" errors per mode:
+
+    python bench/sqlite_writers.py --processes 4 --rate 200 --seconds 10
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+OPS = ("session", "play", "rating", "story")
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--processes", type=int, default=4)
+    p.add_argument("--rate", type=float, default=200.0, help="target writes/s over all processes")
+    p.add_argument("--seconds", type=float, default=10.0)
+    p.add_argument("--mode", choices=("on", "off", "both"), default="both", help="SQLITE_PRODUCTION_MODE")
+    p.add_argument("--out", default="")
+    return p.parse_args(argv)
+
+
+def setup_env(tmp: str, production: bool):
+    """Point both apps at the databases in tmp; must run before either app is imported."""
+    os.environ["SQLITE_PRODUCTION_MODE"] = "1" if production else "0"
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/content.db"
+    os.environ["DEBUG"] = "0"
+    os.environ["DJANGO_SETTINGS_MODULE"] = "nahb_web.settings"
+    sys.path.insert(0, str(ROOT / "django_web"))
+    sys.path.insert(0, str(ROOT / "flask_api"))
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = f"{tmp}/django.sqlite3"
+    django.setup()
+    import app as flask_app
+
+    flask_app.app.config["PROPAGATE_EXCEPTIONS"] = True  # raise DB errors instead of answering 500
+    return flask_app.app
+
+
+def prepare(tmp: str, production: bool, processes: int):
+    flask_app = setup_env(tmp, production)
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+    for i in range(processes):
+        User.objects.create_user(f"writer{i}", password="bench")
+    client = flask_app.test_client()
+    client.get("/health")  # creates and migrates the content DB
+    for i in range(processes):
+        client.post("/stories", json={"title": f"Stress {i}"}).get_json()
+
+
+def worker(index: int, tmp: str, production: bool, interval: float, seconds: float, results):
+    flask_app = setup_env(tmp, production)
+    from django.contrib.auth.models import User
+    from nahb_web.game.models import PlaySession, Rating
+    from nahb_web.game.stats import record_play
+
+    client = flask_app.test_client()
+    client.get("/health")
+    user = User.objects.get(username=f"writer{index}")
+    story_id = index + 1
+    latencies, errors = {op: [] for op in OPS}, Counter()
+    n = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while True:
+        due = started + n * interval
+        if due >= deadline:
+            break
+        if due > time.perf_counter():
+            time.sleep(due - time.perf_counter())
+        op = OPS[n % len(OPS)]
+        t0 = time.perf_counter()
+        try:
+            if op == "session":
+                PlaySession.objects.update_or_create(
+                    user=user, story_id=story_id, defaults={"current_page_id": n, "score": n, "path": [n], "last_roll": None}
+                )
+            elif op == "play":
+                record_play(user, story_id, ending_page_id=n % 7, ending_label=f"E{n % 3}", score=n, path=[1, 2 + n % 5, 9])
+            elif op == "rating":
+                Rating.objects.update_or_create(user=user, story_id=story_id, defaults={"stars": 1 + n % 5})
+            else:
+                r = client.put(f"/stories/{story_id}", json={"description": f"write {n}"})
+                assert r.status_code == 200, r.status_code
+            latencies[op].append((time.perf_counter() - t0) * 1000.0)
+        except Exception as e:
+            errors["database is locked" if "locked" in str(e) else type(e).__name__] += 1
+        n += 1
+    results.put({"latencies": latencies, "errors": dict(errors), "elapsed": time.perf_counter() - started})
+
+
+def run_mode(args, production: bool) -> dict:
+    ctx = multiprocessing.get_context("spawn")  # every worker imports both apps fresh, like a real worker
+    tmp = tempfile.mkdtemp(prefix="nahb-stress-")
+    setup = ctx.Process(target=prepare, args=(tmp, production, args.processes))
+    setup.start()
+    setup.join()
+    if setup.exitcode:
+        raise SystemExit("setup failed")
+    results = ctx.Queue()
+    interval = args.processes / args.rate
+    procs = [ctx.Process(target=worker, args=(i, tmp, production, interval, args.seconds, results)) for i in range(args.processes)]
+    for p in procs:
+        p.start()
+    parts = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    errors = Counter()
+    per_op = {}
+    for op in OPS:
+        lat = sorted(x for part in parts for x in part["latencies"][op])
+        per_op[op] = {
+            "ok": len(lat),
+            "p50_ms": round(lat[len(lat) // 2], 2) if lat else None,
+            "p99_ms": round(lat[max(0, int(len(lat) * 0.99) - 1)], 2) if lat else None,
+        }
+    for part in parts:
+        errors.update(part["errors"])
+    ok = sum(v["ok"] for v in per_op.values())
+    elapsed = max(part["elapsed"] for part in parts)
+    return {
+        "sqlite_production_mode": production,
+        "writes_ok": ok,
+        "writes_per_second": round(ok / elapsed, 1),
+        "lock_errors": errors.get("database is locked", 0),
+        "errors": dict(errors),
+        "ops": per_op,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    modes = {"on": [True], "off": [False], "both": [False, True]}[args.mode]
+    runs = [run_mode(args, production) for production in modes]
+    print(f"target {args.rate:g} writes/s, {args.processes} processes, {args.seconds:g}s")
+    for run in runs:
+        label = "production" if run["sqlite_production_mode"] else "default"
+        lat = ", ".join(f"{op} p50/p99 {v['p50_ms']}/{v['p99_ms']}ms" for op, v in run["ops"].items())
+        print(f"{label:<11} {run['writes_per_second']:>8} writes/s  {run['lock_errors']:>5} lock errors  {run['errors']}  ({lat})")
+    out = Path(args.out) if args.out else ROOT / "bench" / "results" / f"sqlite_writers-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"config": vars(args), "runs": runs}, indent=2))
+    print(f"Results written to {out}")
+    production = [r for r in runs if r["sqlite_production_mode"]]
+    if production and (production[0]["errors"] or production[0]["writes_per_second"] < 0.95 * args.rate):
+        print("FAIL: production mode did not sustain the target rate without errors")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import StoryOwnership, Play, PlaySession, Rating, Report
+from .models import StoryOwnership, Play, PlaySession, Rating, RatingSummary, Report, StoryPlayStat, EndingStat, RouteNode
 
 @admin.register(StoryOwnership)
 class StoryOwnershipAdmin(admin.ModelAdmin):
@@ -16,10 +16,35 @@ class PlayAdmin(admin.ModelAdmin):
 class PlaySessionAdmin(admin.ModelAdmin):
     list_display = ("user", "story_id", "current_page_id", "score", "updated_at")
 
+@admin.register(StoryPlayStat)
+class StoryPlayStatAdmin(admin.ModelAdmin):
+    list_display = ("story_id", "user", "plays")
+    list_filter = ("story_id",)
+
+@admin.register(EndingStat)
+class EndingStatAdmin(admin.ModelAdmin):
+    list_display = ("story_id", "ending_label", "user", "plays")
+    list_filter = ("story_id",)
+
+@admin.register(RouteNode)
+class RouteNodeAdmin(admin.ModelAdmin):
+    list_display = ("story_id", "depth", "page_id", "passes", "completions")
+    list_filter = ("story_id",)
+
 @admin.register(Rating)
 class RatingAdmin(admin.ModelAdmin):
     list_display = ("user", "story_id", "stars", "created_at")
     list_filter = ("stars",)
+    # RatingSummary is kept in step by ratings.save_rating and the post_delete receiver only, so
+    # ratings are not added or re-scored here; deleting one is fine.
+    readonly_fields = ("user", "story_id", "stars")
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(RatingSummary)
+class RatingSummaryAdmin(admin.ModelAdmin):
+    list_display = ("story_id", "count", "avg", "stars_1", "stars_2", "stars_3", "stars_4", "stars_5")
 
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
@@ -0,0 +1,146 @@
+from collections import deque
+
+from .services import api_get, content_cache
+
+
+def _bfs(starts, adj) -> dict:
+    """{node: distance} for every node reachable from starts."""
+    dist = {s: 0 for s in starts}
+    queue = deque(starts)
+    while queue:
+        v = queue.popleft()
+        for w in adj.get(v, ()):
+            if w not in dist:
+                dist[w] = dist[v] + 1
+                queue.append(w)
+    return dist
+
+
+def _cycles(nodes, adj) -> list:
+    """Strongly connected components that contain a cycle (iterative Tarjan, O(V+E))."""
+    index, low, on_stack, stack, out = {}, {}, set(), [], []
+    counter = 0
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(adj.get(root, ())))]
+        while work:
+            v, it = work[-1]
+            descended = False
+            for w in it:
+                if w not in index:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, iter(adj.get(w, ()))))
+                    descended = True
+                    break
+                if w in on_stack:
+                    low[v] = min(low[v], index[w])
+            if descended:
+                continue
+            work.pop()
+            if work:
+                u = work[-1][0]
+                low[u] = min(low[u], low[v])
+            if low[v] == index[v]:
+                comp = []
+                while True:
+                    w = stack.pop()
+                    on_stack.discard(w)
+                    comp.append(w)
+                    if w == v:
+                        break
+                if len(comp) > 1 or v in adj.get(v, ()):
+                    out.append(sorted(comp))
+    return out
+
+
+def analyze_story(story: dict, pages: list) -> dict:
+    """Structural check of a story graph in linear time.
+
+    Reachability and depth from start_page_id, dead ends (non-ending pages without a usable
+    choice), dangling next_page_ids, cycles, and which reachable pages can still lead to an
+    ending. `errors` is what blocks publishing; `warnings` are worth a look but legal.
+    """
+    page_ids = {p["id"] for p in pages}
+    endings = sorted(p["id"] for p in pages if p.get("is_ending"))
+    adj, reverse, dangling = {}, {}, []
+    choice_count = 0
+    for p in pages:
+        targets = []
+        for c in p.get("choices", []):
+            choice_count += 1
+            nxt = c.get("next_page_id")
+            if nxt not in page_ids:
+                dangling.append({"page_id": p["id"], "choice_id": c["id"], "next_page_id": nxt})
+                continue
+            targets.append(nxt)
+            reverse.setdefault(nxt, []).append(p["id"])
+        adj[p["id"]] = list(dict.fromkeys(targets))
+
+    start = story.get("start_page_id")
+    depth = _bfs([start], adj) if start in page_ids else {}
+    reachable = set(depth)
+    finishes = set(_bfs(endings, reverse))  # pages from which some ending can be reached
+    dead_ends = sorted(pid for pid in page_ids if not adj.get(pid) and pid not in endings)
+    stuck = sorted(reachable - finishes)
+    reachable_endings = [e for e in endings if e in reachable]
+
+    errors, warnings = [], []
+    if not start:
+        errors.append("The story has no start page.")
+    elif start not in page_ids:
+        errors.append(f"Start page #{start} does not belong to this story.")
+    if dangling:
+        errors.append(f"{len(dangling)} choice(s) point to pages that do not exist.")
+    if start in page_ids and not reachable_endings:
+        errors.append("No ending can be reached from the start page.")
+    if stuck:
+        errors.append(f"{len(stuck)} reachable page(s) cannot lead to any ending: " + ", ".join(f"#{i}" for i in stuck[:20]))
+    unreachable = sorted(page_ids - reachable)
+    if unreachable:
+        warnings.append(f"{len(unreachable)} page(s) are unreachable from the start page.")
+    cycles = _cycles(sorted(page_ids), adj)
+    if cycles:
+        warnings.append(f"{len(cycles)} loop(s) between pages.")
+
+    return {
+        "ok": not errors,
+        "errors": errors,
+        "warnings": warnings,
+        "page_count": len(page_ids),
+        "choice_count": choice_count,
+        "start_page_id": start,
+        "reachable_count": len(reachable),
+        "unreachable": unreachable,
+        "dead_ends": dead_ends,
+        "stuck": stuck,
+        "dangling": dangling,
+        "cycles": cycles,
+        "endings": endings,
+        "unreachable_endings": [e for e in endings if e not in reachable],
+        "ending_depths": {e: depth[e] for e in reachable_endings},
+        "max_depth": max(depth.values()) if depth else 0,
+    }
+
+
+def story_report(bundle: dict) -> dict:
+    """analyze_story() for a /stories/<id>/bundle, cached per story content version."""
+    key = f"analysis:{bundle['story']['id']}:v{bundle['version']}"
+    cache = content_cache()
+    report = cache.get(key)
+    if report is None:
+        report = analyze_story(bundle["story"], bundle["pages"])
+        cache.set(key, report, timeout=None)  # a version never changes, only falls out of the cache
+    return report
+
+
+def get_story_report(story_id: int) -> dict:
+    # fresh: a publish gate must not pass on a cached copy older than the latest edit.
+    return story_report(api_get(f"/stories/{story_id}/bundle", fresh=True))
@@ -7,6 +7,8 @@ class GameConfig(AppConfig):
     def ready(self):
         from django.db.models.signals import post_migrate
         from django.dispatch import receiver
+        from . import metrics  # noqa: F401  connects the SQL instrumentation to new DB connections
+        from . import ratings  # noqa: F401  keeps RatingSummary in step with Rating deletes
 
         @receiver(post_migrate, sender=self)
         def ensure_groups(sender, **kwargs):
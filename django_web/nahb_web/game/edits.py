@@ -0,0 +1,119 @@
+"""Turn the batch editor form (templates/story_batch_edit.html) into Flask graph-edit ops.
+
+The form shows the pages and choices of one range of BATCH_EDIT_PAGES pages as editable fields;
+only what differs from the bundle the editor was opened on becomes an op, and the whole set is
+sent to POST /stories/<id>/edits in one request.
+"""
+import json
+
+NEW_PAGE_ROWS = 3
+BATCH_EDIT_PAGES = 25
+
+
+def new_page_keys():
+    return [f"new-{n}" for n in range(NEW_PAGE_ROWS)]
+
+
+def page_ranges(pages: list) -> list:
+    """(part number, first page id, last page id) for each BATCH_EDIT_PAGES slice of pages."""
+    return [
+        (n + 1, pages[i]["id"], pages[min(i + BATCH_EDIT_PAGES, len(pages)) - 1]["id"])
+        for n, i in enumerate(range(0, len(pages), BATCH_EDIT_PAGES))
+    ]
+
+
+def page_range(pages: list, part: int) -> list:
+    return pages[(part - 1) * BATCH_EDIT_PAGES:part * BATCH_EDIT_PAGES]
+
+
+def form_fields(post) -> dict:
+    """The submitted editor fields: the JSON object in "fields" (sent by the page's script), or the
+    plain form fields when the browser posted without it. Raises ValueError on malformed JSON."""
+    if not post.get("fields"):
+        return post
+    fields = json.loads(post["fields"])
+    if not isinstance(fields, dict) or not all(isinstance(v, str) for v in fields.values()):
+        raise ValueError("fields must be an object of strings")
+    return fields
+
+
+def _ref(value: str):
+    # Page reference inputs: an existing page id, or the key of a new page row.
+    value = (value or "").strip()
+    if value in new_page_keys():
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _text(post, name: str, default: str = "") -> str:
+    # Sent as submitted: pages written through page_create keep the browser's CRLF line breaks.
+    return post.get(name, default).strip()
+
+
+def _changed(submitted: str, stored) -> bool:
+    # Browsers submit textarea line breaks as CRLF whatever the stored text uses.
+    return submitted.replace("\r\n", "\n") != (stored or "").replace("\r\n", "\n").strip()
+
+
+def _new_choice(post, prefix: str, page_ref):
+    text = _text(post, f"{prefix}-text")
+    if not text:
+        return None
+    return {"op": "create_choice", "page": page_ref, "next_page": _ref(post.get(f"{prefix}-next_page")), "text": text}
+
+
+def ops_from_post(post, story: dict, pages: list) -> list:
+    """Ops for everything the submitted form changes relative to the story's pages."""
+    ops, choice_ops = [], []
+    for key in new_page_keys():
+        text = _text(post, f"{key}-text")
+        if not text:
+            continue
+        ops.append({
+            "op": "create_page", "key": key, "text": text,
+            "is_ending": bool(post.get(f"{key}-is_ending")),
+            "ending_label": _text(post, f"{key}-ending_label"),
+        })
+        op = _new_choice(post, f"newchoice-{key}", key)
+        if op:
+            choice_ops.append(op)
+    for p in pages:
+        prefix = f"page-{p['id']}"
+        if post.get(f"{prefix}-delete"):
+            ops.append({"op": "delete_page", "id": p["id"]})
+            continue
+        changes = {}
+        text = _text(post, f"{prefix}-text", p["text"])
+        if _changed(text, p["text"]):
+            changes["text"] = text
+        if bool(post.get(f"{prefix}-is_ending")) != bool(p.get("is_ending")):
+            changes["is_ending"] = bool(post.get(f"{prefix}-is_ending"))
+        label = _text(post, f"{prefix}-ending_label", p.get("ending_label") or "")
+        if _changed(label, p.get("ending_label")):
+            changes["ending_label"] = label
+        if changes:
+            ops.append({"op": "update_page", "id": p["id"], **changes})
+        for c in p.get("choices", []):
+            cprefix = f"choice-{c['id']}"
+            if post.get(f"{cprefix}-delete"):
+                choice_ops.append({"op": "delete_choice", "id": c["id"]})
+                continue
+            changes = {}
+            text = _text(post, f"{cprefix}-text", c["text"])
+            if _changed(text, c["text"]):
+                changes["text"] = text
+            next_page = _ref(post.get(f"{cprefix}-next_page", str(c["next_page_id"])))
+            if next_page != c["next_page_id"]:
+                changes["next_page"] = next_page
+            if changes:
+                choice_ops.append({"op": "update_choice", "id": c["id"], **changes})
+        op = _new_choice(post, f"newchoice-{p['id']}", p["id"])
+        if op:
+            choice_ops.append(op)
+    start = _ref(post.get("start_page", ""))
+    if start is not None and start != story.get("start_page_id"):
+        choice_ops.append({"op": "set_start", "page": start})
+    return ops + choice_ops
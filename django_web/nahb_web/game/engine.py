@@ -0,0 +1,220 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import Http404
+
+from .services import api_get, get_version
+
+logger = logging.getLogger(__name__)
+
+
+class PlayGraph:
+    """One story version compiled from /stories/<id>/bundle or /versions/<hash> into in-memory
+    adjacency maps. version is the bundle's story version or the snapshot's hash.
+
+    Page dicts keep the shape of GET /pages/<id> (with "choices"), so templates are unchanged.
+    """
+
+    def __init__(self, bundle: dict, version=None):
+        self.story = bundle["story"]
+        self.version = bundle["version"] if version is None else version
+        self.pages = {}
+        self.edges = {}  # page_id -> {choice_id: choice}
+        self.roll_gated = set()  # pages with at least one choice that needs a dice roll
+        for p in bundle["pages"]:
+            self.pages[p["id"]] = p
+            self.edges[p["id"]] = {c["id"]: c for c in p.get("choices", [])}
+            if any(c.get("min_roll") is not None for c in p.get("choices", [])):
+                self.roll_gated.add(p["id"])
+
+    @property
+    def story_id(self) -> int:
+        return self.story["id"]
+
+    @property
+    def start_page_id(self):
+        return self.story.get("start_page_id")
+
+    def page(self, page_id: int):
+        return self.pages.get(page_id)
+
+    def choice(self, page_id: int, choice_id: int):
+        return self.edges.get(page_id, {}).get(choice_id)
+
+    def is_ending(self, page_id: int) -> bool:
+        p = self.pages.get(page_id)
+        return bool(p and p.get("is_ending"))
+
+    def needs_roll(self, page_id: int) -> bool:
+        return page_id in self.roll_gated
+
+    def available_choices(self, page_id: int, roll):
+        """Choices open to a reader with the given dice roll (None = not rolled yet)."""
+        return [c for c in self.edges.get(page_id, {}).values() if choice_allowed(c, roll)]
+
+
+def choice_allowed(choice: dict, roll) -> bool:
+    need = choice.get("min_roll")
+    return need is None or (roll is not None and roll >= need)
+
+
+# Compiled graphs per worker process, each map bounded to PLAY_GRAPH_CACHE_SIZE entries (LRU):
+# story_id -> (graph, checked_at) for live stories, version hash -> graph for published snapshots.
+_graphs = OrderedDict()
+_versions = OrderedDict()
+_graphs_lock = threading.Lock()
+_inflight = {}  # key -> Future of the one fetch in progress for it (single flight)
+_prefetcher = None
+_prefetcher_pid = None
+
+
+def _lru_get(cache: OrderedDict, key):
+    with _graphs_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _lru_put(cache: OrderedDict, key, value):
+    with _graphs_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > settings.PLAY_GRAPH_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def _single_flight(key, fetch):
+    """Run fetch() once for concurrent callers with the same key; the others wait for its result."""
+    with _graphs_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        return future.result()
+    try:
+        future.set_result(fetch())
+    except BaseException as e:
+        future.set_exception(e)
+    finally:
+        with _graphs_lock:
+            _inflight.pop(key, None)
+    return future.result()
+
+
+def _run_prefetch(fn, *args):
+    try:
+        fn(*args)
+    except Exception:
+        # The next foreground call fetches again and raises.
+        logger.debug("Prefetching a play graph failed", exc_info=True)
+    finally:
+        close_old_connections()  # in case the content cache is database-backed
+
+
+def _prefetch(fn, *args):
+    """Run fn(*args) on the per-process prefetch pool without waiting for it."""
+    global _prefetcher, _prefetcher_pid
+    pid = os.getpid()
+    if _prefetcher_pid != pid:  # a pool started before a fork has no threads in the child
+        with _graphs_lock:
+            if _prefetcher_pid != pid:
+                _prefetcher = ThreadPoolExecutor(settings.PLAY_PREFETCH_WORKERS, thread_name_prefix="play-prefetch")
+                _prefetcher_pid = pid
+    _prefetcher.submit(_run_prefetch, fn, *args)
+
+
+def _load_play_graph(story_id: int, fresh: bool) -> PlayGraph:
+    entry = _lru_get(_graphs, story_id)
+    bundle = api_get(f"/stories/{story_id}/bundle", fresh=fresh)
+    if entry and entry[0].version == bundle["version"]:
+        graph = entry[0]
+    else:
+        graph = PlayGraph(bundle)
+    _lru_put(_graphs, story_id, (graph, time.monotonic()))
+    return graph
+
+
+def get_play_graph(story_id: int, refresh: bool = False) -> PlayGraph:
+    """Compiled graph for a story; the bundle is re-read at most every PLAY_GRAPH_TTL seconds.
+
+    An expired graph is still served while a background fetch re-reads the bundle, so readers
+    only wait on a cold start or an explicit refresh. The bundle is only recompiled when its
+    version changed.
+    """
+    entry = _lru_get(_graphs, story_id)
+    if entry and not refresh:
+        if time.monotonic() - entry[1] >= settings.PLAY_GRAPH_TTL:
+            prefetch_play_graph(story_id)
+        return entry[0]
+    return _single_flight(("story", story_id, refresh), lambda: _load_play_graph(story_id, refresh))
+
+
+def _refresh_play_graph(story_id: int):
+    # Re-checked when the task runs: a refresh queued behind another one has nothing left to do.
+    entry = _lru_get(_graphs, story_id)
+    if entry is None or time.monotonic() - entry[1] >= settings.PLAY_GRAPH_TTL:
+        _single_flight(("story", story_id, False), lambda: _load_play_graph(story_id, False))
+
+
+def prefetch_play_graph(story_id: int):
+    _prefetch(_refresh_play_graph, story_id)
+
+
+def _load_version_graph(version_hash: str) -> PlayGraph:
+    graph = PlayGraph(get_version(version_hash), version=version_hash)
+    _lru_put(_versions, version_hash, graph)
+    return graph
+
+
+def get_version_graph(version_hash: str) -> PlayGraph:
+    """Compiled graph of a published snapshot (see Flask /versions/<hash>); never goes stale."""
+    graph = _lru_get(_versions, version_hash)
+    if graph is None:
+        graph = _single_flight(("version", version_hash), lambda: _load_version_graph(version_hash))
+    return graph
+
+
+def prefetch_published_graph(story: dict):
+    """Warm the graph a reader of this story will start on, without waiting for it."""
+    version_hash = story.get("published_hash")
+    if version_hash:
+        if _lru_get(_versions, version_hash) is None:
+            _prefetch(_single_flight, ("version", version_hash), lambda: _load_version_graph(version_hash))
+    elif _lru_get(_graphs, story["id"]) is None:
+        prefetch_play_graph(story["id"])
+
+
+def get_published_graph(story: dict) -> PlayGraph:
+    """Graph readers start on: the story's published snapshot, or the live story if it has none."""
+    if story.get("published_hash"):
+        return get_version_graph(story["published_hash"])
+    return get_play_graph(story["id"])
+
+
+def get_play_page(story_id: int, page_id: int, version_hash: str = ""):
+    """(graph, page) for a page of the story as of the given published version ("" = live story).
+
+    A live graph is refreshed once in case the cached copy is stale.
+    """
+    if version_hash:
+        graph = get_version_graph(version_hash)
+        page = graph.page(page_id)
+        if page is None:
+            raise Http404("Page not found")
+        return graph, page
+    graph = get_play_graph(story_id)
+    page = graph.page(page_id)
+    if page is None:
+        graph = get_play_graph(story_id, refresh=True)
+        page = graph.page(page_id)
+    if page is None:
+        raise Http404("Page not found")
+    return graph, page
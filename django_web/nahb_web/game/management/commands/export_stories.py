@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from nahb_web.game.services import get_client
+
+
+class Command(BaseCommand):
+    help = "Stream stories with their pages and choices from the Flask API as NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--story", type=int, action="append", default=[], help="Only export this story (repeatable).")
+        parser.add_argument("--status", default="", help="Only export stories with this status, e.g. published.")
+        parser.add_argument("-o", "--output", default="-", help="Output file (default: stdout).")
+        parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for each chunk.")
+
+    def handle(self, *args, **options):
+        params = {}
+        if options["status"]:
+            params["status"] = options["status"]
+        if options["story"]:
+            params["ids"] = ",".join(map(str, options["story"]))
+        r = get_client().send("GET", "/stories/export.ndjson", params=params, stream=True, timeout=(3.05, options["timeout"]))
+        out = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        written = 0
+        try:
+            for chunk in r.iter_content(chunk_size=64 * 1024):
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            r.close()
+            if out is not sys.stdout.buffer:
+                out.close()
+        self.stderr.write(self.style.SUCCESS(f"Exported {written} bytes."))
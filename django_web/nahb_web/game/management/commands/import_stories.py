@@ -0,0 +1,68 @@
+import sys
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from nahb_web.game.models import StoryOwnership
+from nahb_web.game.services import get_client, invalidate_listings
+
+
+def read_lines(f, batch_bytes=64 * 1024):
+    """Yield the file in chunks of whole lines, so the upload streams without splitting records."""
+    buf = []
+    size = 0
+    for line in f:
+        buf.append(line)
+        size += len(line)
+        if size >= batch_bytes:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield b"".join(buf)
+
+
+class Command(BaseCommand):
+    help = "Stream an NDJSON export (see export_stories) into the Flask API as new stories."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="NDJSON file, or - for stdin.")
+        parser.add_argument("--owner", default="", help="Username that owns the imported stories.")
+        parser.add_argument("--timeout", type=float, default=600.0, help="Seconds to wait for the import to finish.")
+
+    def handle(self, *args, **options):
+        owner = None
+        if options["owner"]:
+            try:
+                owner = get_user_model().objects.get(username=options["owner"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Unknown user {options['owner']!r}")
+        f = sys.stdin.buffer if options["file"] == "-" else open(options["file"], "rb")
+        try:
+            r = get_client().send(
+                "POST", "/stories/import.ndjson", data=read_lines(f),
+                headers={"Content-Type": "application/x-ndjson"}, timeout=(3.05, options["timeout"]),
+            )
+            result, error = r.json(), None
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 400:
+                raise
+            result = e.response.json()
+            error = f"line {result['line']}: {result['error']}"
+        finally:
+            if f is not sys.stdin.buffer:
+                f.close()
+
+        imported = result["imported"]
+        if owner is not None:
+            StoryOwnership.objects.bulk_create(
+                [StoryOwnership(story_id=s["id"], owner=owner) for s in imported], batch_size=500
+            )
+        if imported:
+            invalidate_listings()
+        pages = sum(s["pages"] for s in imported)
+        choices = sum(s["choices"] for s in imported)
+        summary = f"Imported {len(imported)} stories, {pages} pages, {choices} choices."
+        if error:
+            raise CommandError(f"{summary} Stopped at {error}")
+        self.stdout.write(self.style.SUCCESS(summary))
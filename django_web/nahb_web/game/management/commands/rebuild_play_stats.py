@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from nahb_web.game.stats import rebuild_play_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-story and per-ending play rollups from the Play history."
+
+    def handle(self, *args, **options):
+        stories, endings = rebuild_play_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {stories} story rows and {endings} ending rows."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from nahb_web.game.ratings import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-story rating summaries from the Rating table."
+
+    def handle(self, *args, **options):
+        n = rebuild_rating_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {n} rating summaries."))
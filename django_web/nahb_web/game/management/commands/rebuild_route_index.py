@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from nahb_web.game.routes import rebuild_route_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the route trie (RouteNode) from the Play history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--story", type=int, default=None, help="Only rebuild this story.")
+
+    def handle(self, *args, **options):
+        n = rebuild_route_index(options["story"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {n} route nodes."))
@@ -0,0 +1,182 @@
+"""In-process request metrics exposed at /metrics in the Prometheus text format.
+
+MetricsMiddleware times every request and splits it into the time spent in SQL (every
+connection gets a counting execute wrapper), in Flask calls (FlaskClient reports each call)
+and everything else (view code and template rendering). Counters are per worker process;
+scrape every worker, or run one.
+"""
+import contextvars
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, esc)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                yield f"{self.name}{_labels(self.labels, key)} {value:g}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, tuple(labels), tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            v = self._values.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    def samples(self):
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                for bound, n in zip(self.buckets, v):
+                    yield f"{self.name}_bucket{_labels(names, key + (f'{bound:g}',))} {n}"
+                yield f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {v[-1]}"
+                yield f"{self.name}_sum{_labels(self.labels, key)} {v[-2]:g}"
+                yield f"{self.name}_count{_labels(self.labels, key)} {v[-1]}"
+
+
+REGISTRY = []
+
+REQUESTS = Counter("nahb_http_requests_total", "Requests handled, by view and status.", ("view", "method", "status"))
+REQUEST_SECONDS = Histogram("nahb_http_request_duration_seconds", "Request latency by view.", ("view", "method"))
+PHASE_SECONDS = Histogram(
+    "nahb_http_request_phase_seconds",
+    "Request time by phase: db (SQL), flask (content API calls), other (view code, templates).",
+    ("view", "phase"),
+)
+REQUEST_QUERIES = Histogram("nahb_db_queries_per_request", "SQL statements per request.", ("view",), COUNT_BUCKETS)
+DB_QUERIES = Counter("nahb_db_queries_total", "SQL statements executed, by view.", ("view",))
+DB_SECONDS = Counter("nahb_db_query_seconds_total", "Time spent in SQL, by view.", ("view",))
+FLASK_CALLS = Counter("nahb_flask_requests_total", "Calls to the Flask content API.", ("endpoint", "status"))
+FLASK_SECONDS = Histogram("nahb_flask_request_duration_seconds", "Flask content API call latency.", ("endpoint",))
+
+# Per-request accumulator; contextvars follow the request into sync_to_async worker threads.
+_current = contextvars.ContextVar("nahb_request_metrics", default=None)
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current = _current.get()
+        if current is not None:
+            current["queries"] += 1
+            current["db"] += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def _instrument_connection(sender, connection, **kwargs):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def record_flask_call(endpoint: str, seconds: float, status):
+    """Called by FlaskClient for every outbound request."""
+    FLASK_CALLS.inc(endpoint, status or "error")
+    FLASK_SECONDS.observe(seconds, endpoint)
+    current = _current.get()
+    if current is not None:
+        current["flask"] += seconds
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        current, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, current, started)
+        return response
+
+    async def __acall__(self, request):
+        current, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, current, started)
+        return response
+
+    def _start(self):
+        current = {"queries": 0, "db": 0.0, "flask": 0.0}
+        return current, _current.set(current), time.perf_counter()
+
+    def _finish(self, request, response, current, started):
+        elapsed = time.perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "<unmatched>"
+        REQUESTS.inc(view, request.method, str(response.status_code))
+        REQUEST_SECONDS.observe(elapsed, view, request.method)
+        PHASE_SECONDS.observe(current["db"], view, "db")
+        PHASE_SECONDS.observe(current["flask"], view, "flask")
+        PHASE_SECONDS.observe(max(0.0, elapsed - current["db"] - current["flask"]), view, "other")
+        REQUEST_QUERIES.observe(current["queries"], view)
+        DB_QUERIES.inc(view, amount=current["queries"])
+        DB_SECONDS.inc(view, amount=current["db"])
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden("Forbidden")
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4; charset=utf-8")
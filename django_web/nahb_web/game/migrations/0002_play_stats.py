@@ -0,0 +1,61 @@
+# Generated by Django 5.0.8 on 2026-10-17 03:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # Rollups are maintained by increments from here on, so existing plays must be counted first.
+    from nahb_web.game.stats import rebuild_play_stats
+
+    rebuild_play_stats(
+        apps.get_model("game", "Play"), apps.get_model("game", "StoryPlayStat"), apps.get_model("game", "EndingStat"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EndingStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.IntegerField()),
+                ('ending_label', models.CharField(blank=True, default='', max_length=120)),
+                ('plays', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ending_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StoryPlayStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.IntegerField()),
+                ('plays', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='story_play_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='endingstat',
+            constraint=models.UniqueConstraint(fields=('user', 'story_id', 'ending_label'), name='uniq_ending_stat_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='endingstat',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('story_id', 'ending_label'), name='uniq_ending_stat_global'),
+        ),
+        migrations.AddConstraint(
+            model_name='storyplaystat',
+            constraint=models.UniqueConstraint(fields=('user', 'story_id'), name='uniq_story_play_stat_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='storyplaystat',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('story_id',), name='uniq_story_play_stat_global'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
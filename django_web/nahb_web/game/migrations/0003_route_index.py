@@ -0,0 +1,33 @@
+# Generated by Django 5.0.8 on 2026-10-17 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0002_play_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.IntegerField()),
+                ('key', models.BinaryField()),
+                ('page_id', models.IntegerField()),
+                ('depth', models.PositiveIntegerField()),
+                ('first_visit', models.BooleanField(default=True)),
+                ('passes', models.IntegerField(default=0)),
+                ('completions', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['story_id', 'completions'], name='route_node_completions'), models.Index(fields=['story_id', 'depth'], name='route_node_depth'), models.Index(fields=['story_id', 'page_id', 'first_visit'], name='route_node_page')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='routenode',
+            constraint=models.UniqueConstraint(fields=('story_id', 'key'), name='uniq_route_node_key'),
+        ),
+    ]
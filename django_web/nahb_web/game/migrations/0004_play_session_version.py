@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-17 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0003_route_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playsession',
+            name='version_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.8 on 2026-10-17 03:48
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # Summaries are maintained by deltas from here on, so existing ratings must be counted first.
+    from nahb_web.game.ratings import rebuild_rating_summaries
+
+    rebuild_rating_summaries(apps.get_model("game", "Rating"), apps.get_model("game", "RatingSummary"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0004_play_session_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.IntegerField(unique=True)),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('stars_1', models.IntegerField(default=0)),
+                ('stars_2', models.IntegerField(default=0)),
+                ('stars_3', models.IntegerField(default=0)),
+                ('stars_4', models.IntegerField(default=0)),
+                ('stars_5', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.8 on 2026-10-17 04:03
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def _node_key(parent_key, page_id):
+    # Frozen copy of routes.node_key.
+    return hashlib.blake2b(parent_key + int(page_id).to_bytes(8, "big"), digest_size=16).digest()
+
+
+def _decode_varints(key):
+    ids, n, shift = [], 0, 0
+    for b in bytes(key):
+        n |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            ids.append(n)
+            n, shift = 0, 0
+    return ids
+
+
+def rekey_route_nodes(apps, schema_editor):
+    # Old keys were the varint-encoded full prefix; replace them with chained fixed-size ids.
+    RouteNode = apps.get_model("game", "RouteNode")
+    batch = []
+    for node in RouteNode.objects.only("key", "page_id").iterator(chunk_size=2000):
+        parent = b""
+        for page_id in _decode_varints(node.key)[:-1]:
+            parent = _node_key(parent, page_id)
+        node.parent_key, node.key = parent, _node_key(parent, node.page_id)
+        batch.append(node)
+        if len(batch) >= 1000:
+            RouteNode.objects.bulk_update(batch, ["key", "parent_key"])
+            batch = []
+    RouteNode.objects.bulk_update(batch, ["key", "parent_key"])
+
+
+def drop_route_nodes(apps, schema_editor):
+    # The index is derived data; after migrating back run `manage.py rebuild_route_index`.
+    apps.get_model("game", "RouteNode").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0005_rating_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routenode',
+            name='parent_key',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RunPython(rekey_route_nodes, drop_route_nodes),
+    ]
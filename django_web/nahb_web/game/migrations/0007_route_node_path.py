@@ -0,0 +1,51 @@
+# Generated by Django 5.0.8 on 2026-10-17 04:18
+
+from django.db import migrations, models
+
+
+def _encode_varints(page_ids):
+    # Frozen copy of routes.encode_path.
+    out = bytearray()
+    for n in page_ids:
+        while True:
+            b = n & 0x7F
+            n >>= 7
+            if n:
+                out.append(b | 0x80)
+            else:
+                out.append(b)
+                break
+    return bytes(out)
+
+
+def fill_completed_paths(apps, schema_editor):
+    # Walk parent links once per story to store the full path on every node a play ended on.
+    RouteNode = apps.get_model("game", "RouteNode")
+    for story_id in RouteNode.objects.values_list("story_id", flat=True).distinct().order_by():
+        links = {bytes(k): (bytes(p), page_id) for k, p, page_id in
+                 RouteNode.objects.filter(story_id=story_id).values_list("key", "parent_key", "page_id").iterator()}
+        batch = []
+        for node in RouteNode.objects.filter(story_id=story_id, completions__gt=0).only("key"):
+            path, key = [], bytes(node.key)
+            while key in links:
+                key, page_id = links[key]
+                path.append(page_id)
+            node.path = _encode_varints(reversed(path))
+            batch.append(node)
+        RouteNode.objects.bulk_update(batch, ["path"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0006_route_node_parent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routenode',
+            name='path',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(fill_completed_paths, migrations.RunPython.noop),
+    ]
@@ -22,6 +22,60 @@ class Play(models.Model):
     def __str__(self):
         return f"Play(user={self.user_id}, story={self.story_id}, ending={self.ending_label or self.ending_page_id})"
 
+class StoryPlayStat(models.Model):
+    """Completed plays per story, kept up to date by stats.record_play(). user=None is the global row."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name="story_play_stats")
+    story_id = models.IntegerField()
+    plays = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "story_id"], name="uniq_story_play_stat_per_user"),
+            models.UniqueConstraint(fields=["story_id"], condition=models.Q(user__isnull=True), name="uniq_story_play_stat_global"),
+        ]
+
+class EndingStat(models.Model):
+    """Completed plays per (story, ending_label); user=None is the global row."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name="ending_stats")
+    story_id = models.IntegerField()
+    ending_label = models.CharField(max_length=120, blank=True, default="")
+    plays = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "story_id", "ending_label"], name="uniq_ending_stat_per_user"),
+            models.UniqueConstraint(fields=["story_id", "ending_label"], condition=models.Q(user__isnull=True), name="uniq_ending_stat_global"),
+        ]
+
+class RouteNode(models.Model):
+    """One node of a story's route trie: a prefix of completed play paths, stored as its last page
+    and a link to the node of the prefix one page shorter.
+
+    key is a fixed-size id derived from parent_key and page_id (see routes.node_key); parent_key is
+    empty for first pages. Nodes some play ended on also keep their whole path, varint-encoded
+    (routes.encode_path), so top routes are read without walking the trie. Maintained by
+    routes.index_play().
+    """
+    story_id = models.IntegerField()
+    key = models.BinaryField()
+    parent_key = models.BinaryField(default=b"")
+    path = models.BinaryField(null=True)  # set once completions > 0
+    page_id = models.IntegerField()
+    depth = models.PositiveIntegerField()
+    first_visit = models.BooleanField(default=True)  # page_id does not occur earlier in the prefix
+    passes = models.IntegerField(default=0)  # plays whose path starts with this prefix
+    completions = models.IntegerField(default=0)  # plays whose full path is exactly this prefix
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["story_id", "key"], name="uniq_route_node_key"),
+        ]
+        indexes = [
+            models.Index(fields=["story_id", "completions"], name="route_node_completions"),
+            models.Index(fields=["story_id", "depth"], name="route_node_depth"),
+            models.Index(fields=["story_id", "page_id", "first_visit"], name="route_node_page"),
+        ]
+
 class PlaySession(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="play_sessions")
     story_id = models.IntegerField()
@@ -29,6 +83,8 @@ class PlaySession(models.Model):
     score = models.IntegerField(default=0)
     path = models.JSONField(default=list)
     last_roll = models.IntegerField(null=True, blank=True)
+    # Published snapshot (Flask /versions/<hash>) the play started on; "" for plays of the live story.
+    version_hash = models.CharField(max_length=64, blank=True, default="")
     updated_at = models.DateTimeField(auto_now=True)
 
 class Rating(models.Model):
@@ -41,6 +97,26 @@ class Rating(models.Model):
     class Meta:
         unique_together = ("user", "story_id")
 
+class RatingSummary(models.Model):
+    """Ratings per story, kept up to date by ratings.save_rating() and on Rating deletes."""
+    story_id = models.IntegerField(unique=True)
+    count = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)  # sum of stars
+    stars_1 = models.IntegerField(default=0)
+    stars_2 = models.IntegerField(default=0)
+    stars_3 = models.IntegerField(default=0)
+    stars_4 = models.IntegerField(default=0)
+    stars_5 = models.IntegerField(default=0)
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def histogram(self):
+        """[(stars, ratings)] from 5 stars down."""
+        return [(n, getattr(self, f"stars_{n}")) for n in range(5, 0, -1)]
+
 class Report(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="reports")
     story_id = models.IntegerField(db_index=True)
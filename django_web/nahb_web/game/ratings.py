@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Rating, RatingSummary
+from .stats import bump_counters
+
+STARS = range(1, 6)
+
+
+def _apply(story_id: int, count: int = 0, total: int = 0, **stars):
+    bump_counters(RatingSummary, {"story_id": story_id}, {"count": count, "total": total, **stars})
+
+
+@transaction.atomic
+def save_rating(user, story_id: int, stars: int, comment: str = "") -> Rating:
+    """Create or update the user's Rating and adjust the story's RatingSummary in the same transaction."""
+    old = Rating.objects.select_for_update().filter(user=user, story_id=story_id).values_list("stars", flat=True).first()
+    rating, _ = Rating.objects.update_or_create(
+        user=user, story_id=story_id, defaults={"stars": stars, "comment": comment},
+    )
+    if old is None:
+        _apply(story_id, count=1, total=stars, **{f"stars_{stars}": 1})
+    elif old != stars:
+        _apply(story_id, total=stars - old, **{f"stars_{old}": -1, f"stars_{stars}": 1})
+    return rating
+
+
+@receiver(post_delete, sender=Rating)
+def _rating_deleted(sender, instance, **kwargs):
+    # Admin deletes and user cascades; runs inside the deleting transaction.
+    _apply(instance.story_id, count=-1, total=-instance.stars, **{f"stars_{instance.stars}": -1})
+
+
+@transaction.atomic
+def rebuild_rating_summaries(rating_model=Rating, summary_model=RatingSummary):
+    """Recompute every RatingSummary row from the Rating table.
+
+    The models can be swapped for historical ones, so migration 0005 backfills with this too.
+    """
+    summary_model.objects.all().delete()
+    rows = [
+        summary_model(story_id=r.pop("story_id"), **r)
+        for r in rating_model.objects.values("story_id").annotate(
+            count=Count("id"), total=Sum("stars"), **{f"stars_{n}": Count("id", filter=Q(stars=n)) for n in STARS}
+        ).order_by()
+    ]
+    summary_model.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
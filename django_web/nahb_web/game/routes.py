@@ -0,0 +1,129 @@
+import hashlib
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import Play, RouteNode
+
+ROOT = b""
+
+
+def node_key(parent_key: bytes, page_id) -> bytes:
+    """16-byte id of the trie node reached from parent_key (ROOT for the first page) by page_id.
+
+    Chaining the parent's id keeps every node O(1) in size, so a path of length L costs L nodes
+    of constant size instead of L prefixes of growing size.
+    """
+    return hashlib.blake2b(bytes(parent_key) + int(page_id).to_bytes(8, "big"), digest_size=16).digest()
+
+
+def encode_path(page_ids) -> bytes:
+    """Unsigned LEB128 varints, one per page id: a 30-step path of small ids is ~30-60 bytes."""
+    out = bytearray()
+    for n in page_ids:
+        n = int(n)
+        while True:
+            b = n & 0x7F
+            n >>= 7
+            if n:
+                out.append(b | 0x80)
+            else:
+                out.append(b)
+                break
+    return bytes(out)
+
+
+def decode_path(data) -> list:
+    ids, n, shift = [], 0, 0
+    for b in bytes(data):
+        n |= (b & 0x7F) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            ids.append(n)
+            n, shift = 0, 0
+    return ids
+
+
+def _prefix_nodes(story_id: int, path):
+    """(key, node fields) for every prefix of path."""
+    seen = set()
+    out = []
+    parent = ROOT
+    for depth, page_id in enumerate(map(int, path), start=1):
+        key = node_key(parent, page_id)
+        out.append((key, {
+            "story_id": story_id,
+            "parent_key": parent,
+            "page_id": page_id,
+            "depth": depth,
+            "first_visit": page_id not in seen,
+        }))
+        seen.add(page_id)
+        parent = key
+    return out
+
+
+@transaction.atomic
+def index_play(story_id: int, path):
+    """Add one completed path to the story's route trie (three statements whatever the path length)."""
+    if not path:
+        return
+    nodes = _prefix_nodes(story_id, path)
+    keys = [k for k, _ in nodes]
+    RouteNode.objects.bulk_create([RouteNode(key=k, **f) for k, f in nodes], ignore_conflicts=True)
+    RouteNode.objects.filter(story_id=story_id, key__in=keys).update(passes=F("passes") + 1)
+    RouteNode.objects.filter(story_id=story_id, key=keys[-1]).update(
+        completions=F("completions") + 1, path=encode_path(path),
+    )
+
+
+@transaction.atomic
+def rebuild_route_index(story_id=None):
+    """Recompute route tries from the Play history (one story, or all of them)."""
+    plays = Play.objects.all() if story_id is None else Play.objects.filter(story_id=story_id)
+    (RouteNode.objects.all() if story_id is None else RouteNode.objects.filter(story_id=story_id)).delete()
+    counts = defaultdict(lambda: [None, 0, 0, None])  # (story_id, key) -> [fields, passes, completions, path]
+    for sid, path in plays.values_list("story_id", "path").iterator(chunk_size=2000):
+        nodes = _prefix_nodes(sid, path or [])
+        for i, (key, fields) in enumerate(nodes):
+            c = counts[(sid, key)]
+            c[0] = fields
+            c[1] += 1
+            if i == len(nodes) - 1:
+                c[2] += 1
+                c[3] = c[3] or encode_path(path)
+    RouteNode.objects.bulk_create(
+        [RouteNode(key=key, passes=p, completions=done, path=encoded, **fields)
+         for (_, key), (fields, p, done, encoded) in counts.items()],
+        batch_size=1000,
+    )
+    return len(counts)
+
+
+def top_paths(story_id: int, limit: int = 10):
+    """Most common complete routes: [{"path": [...], "plays": n}], in one query."""
+    rows = (RouteNode.objects.filter(story_id=story_id, completions__gt=0)
+            .order_by("-completions", "depth").values_list("path", "completions")[:limit])
+    return [{"path": decode_path(path), "plays": n} for path, n in rows]
+
+
+def dropoff_by_depth(story_id: int):
+    """Readers still playing at each depth, and how many of them finished right there."""
+    rows = (RouteNode.objects.filter(story_id=story_id).values("depth")
+            .annotate(readers=Sum("passes"), finished=Sum("completions")).order_by("depth"))
+    return [{"depth": r["depth"], "readers": r["readers"], "finished": r["finished"]} for r in rows]
+
+
+def passes_through(story_id: int, page_id: int) -> int:
+    """Completed plays that visited page_id at least once."""
+    agg = RouteNode.objects.filter(story_id=story_id, page_id=page_id, first_visit=True).aggregate(n=Sum("passes"))
+    return agg["n"] or 0
+
+
+def page_reach(story_id: int):
+    """{page_id: completed plays that visited it} for the whole story."""
+    rows = (RouteNode.objects.filter(story_id=story_id, first_visit=True).values("page_id")
+            .annotate(n=Sum("passes")).order_by())
+    return {r["page_id"]: r["n"] for r in rows}
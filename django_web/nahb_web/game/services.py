@@ -1,42 +1,292 @@
+import hashlib
+import json
+import os
 import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import record_flask_call
+
+ID_SEGMENT_RE = re.compile(r"/\d+(?=/|$)")
+
+
+class FlaskClient:
+    """Keep-alive client for the Flask content API.
+
+    The connection pool (HTTPAdapter) is shared by the whole worker process;
+    every thread gets its own Session on top of it so no request state is shared.
+    GETs are retried with backoff, writes are never replayed.
+    GET bodies are kept with their ETag/Last-Modified and revalidated, so an
+    unchanged resource costs a 304 instead of a full download.
+    """
+
+    def __init__(self, base_url: str, api_key: str = "", pool_size: int = 10,
+                 connect_timeout: float = 3.05, read_timeout: float = 10.0,
+                 retries: int = 2, backoff: float = 0.2, validator_cache_size: int = 512):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._validators = OrderedDict()  # (path, params) -> (etag, last_modified, raw body)
+        self._validator_cache_size = validator_cache_size
+
+    def headers(self):
+        h = {"Accept": "application/json"}
+        if self.api_key:
+            h["X-API-KEY"] = self.api_key
+        return h
+
+    @property
+    def session(self) -> requests.Session:
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = requests.Session()
+            s.mount("http://", self._adapter)
+            s.mount("https://", self._adapter)
+            s.headers.update(self.headers())
+            self._local.session = s
+        return s
+
+    def send(self, method: str, path: str, **kwargs) -> requests.Response:
+        status = None
+        started = time.perf_counter()
+        try:
+            kwargs.setdefault("timeout", self.timeout)
+            r = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            status = r.status_code
+        finally:
+            self._record(method, path, time.perf_counter() - started, status)
+        r.raise_for_status()
+        return r
+
+    def request(self, method: str, path: str, **kwargs):
+        return self.send(method, path, **kwargs).json()
+
+    def get(self, path: str, params=None):
+        key = (path, tuple(sorted((params or {}).items())))
+        with self._lock:
+            cached = self._validators.get(key)
+        headers = {}
+        if cached:
+            etag, last_modified, _ = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        r = self.send("GET", path, params=params, headers=headers)
+        if r.status_code == 304 and cached:
+            body = cached[2]
+            with self._lock:
+                if key in self._validators:
+                    self._validators.move_to_end(key)
+        else:
+            body = r.content
+            etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+            with self._lock:
+                if etag or last_modified:
+                    self._validators[key] = (etag, last_modified, body)
+                    self._validators.move_to_end(key)
+                    while len(self._validators) > self._validator_cache_size:
+                        self._validators.popitem(last=False)
+                else:
+                    self._validators.pop(key, None)
+        # Parse per call: callers are free to mutate what they get back.
+        return json.loads(body)
+
+    def post(self, path: str, payload: dict):
+        return self.request("POST", path, json=payload)
+
+    def put(self, path: str, payload: dict):
+        return self.request("PUT", path, json=payload)
+
+    def delete(self, path: str):
+        return self.request("DELETE", path)
+
+    def _record(self, method: str, path: str, elapsed: float, status):
+        key = f"{method} {ID_SEGMENT_RE.sub('/<id>', path)}"
+        record_flask_call(key, elapsed, status)
+        ms = elapsed * 1000.0
+        with self._lock:
+            c = self._latency.setdefault(key, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            c["count"] += 1
+            c["total_ms"] += ms
+            c["max_ms"] = max(c["max_ms"], ms)
+            if status is None or status >= 400:
+                c["errors"] += 1
+
+    def latency_stats(self) -> dict:
+        """Per-endpoint counters since process start, e.g. {"GET /pages/<id>": {...}}."""
+        with self._lock:
+            out = {}
+            for key, c in self._latency.items():
+                out[key] = dict(c, avg_ms=c["total_ms"] / c["count"] if c["count"] else 0.0)
+            return out
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> FlaskClient:
+    # One client per worker process: a client built before a fork must not share sockets with the child.
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = FlaskClient(
+                    settings.FLASK_API_BASE,
+                    api_key=settings.FLASK_API_KEY,
+                    pool_size=settings.FLASK_API_POOL_SIZE,
+                    connect_timeout=settings.FLASK_API_CONNECT_TIMEOUT,
+                    read_timeout=settings.FLASK_API_READ_TIMEOUT,
+                    retries=settings.FLASK_API_RETRIES,
+                    backoff=settings.FLASK_API_RETRY_BACKOFF,
+                    validator_cache_size=settings.FLASK_API_VALIDATOR_CACHE_SIZE,
+                )
+                _client_pid = pid
+    return _client
+
+
+# -----------------------
+# Read-through content cache (Django cache framework, alias settings.CONTENT_CACHE_ALIAS)
+# -----------------------
+# Single resources are cached under a fixed key and deleted exactly by the author views that
+# change them. Listings (/stories, anything with query params) embed a generation number
+# that is bumped on every content write, which drops all of them at once.
+LISTING_GENERATION_KEY = "content:listing-gen"
+
+
+def content_cache():
+    return caches[settings.CONTENT_CACHE_ALIAS]
+
+
+def _listing_generation(cache) -> int:
+    gen = cache.get(LISTING_GENERATION_KEY)
+    if gen is None:
+        # Seed from the clock so an evicted counter never falls back to a generation still in the cache.
+        gen = int(time.time() * 1000)
+        cache.add(LISTING_GENERATION_KEY, gen, timeout=None)
+        gen = cache.get(LISTING_GENERATION_KEY, gen)
+    return gen
+
+
+def content_key(path: str, params=None) -> str:
+    if not params and path != "/stories":
+        return f"content:{path}"
+    query = urlencode(sorted((params or {}).items()), doseq=True)
+    gen = _listing_generation(content_cache())
+    return f"content:{path}:g{gen}:{hashlib.sha1(query.encode()).hexdigest()[:16]}"
+
+
+def invalidate_listings():
+    cache = content_cache()
+    try:
+        cache.incr(LISTING_GENERATION_KEY)
+    except ValueError:
+        _listing_generation(cache)
+
+
+def invalidate_story(story_id: int, page_ids=()):
+    """Drop every cached read that a write to this story (and the given pages) can change."""
+    paths = [f"/stories/{story_id}", f"/stories/{story_id}/pages", f"/stories/{story_id}/bundle", f"/stories/{story_id}/start"]
+    paths += [f"/pages/{pid}" for pid in page_ids]
+    content_cache().delete_many([content_key(p) for p in paths])
+    invalidate_listings()
+
+
+def invalidate_changed_pages(pages):
+    """invalidate_story() for the "changed_pages" ([{"id", "story_id"}]) of a Flask delete response."""
+    by_story = {}
+    for p in pages:
+        by_story.setdefault(p["story_id"], []).append(p["id"])
+    for story_id, page_ids in by_story.items():
+        invalidate_story(story_id, page_ids)
 
-SCORE_RE = re.compile(r"\((?P<sign>[+-])(?P<num>\d+)\)")
 
 def api_headers():
-    h = {"Accept": "application/json"}
-    if settings.FLASK_API_KEY:
-        h["X-API-KEY"] = settings.FLASK_API_KEY
-    return h
+    return get_client().headers()
+
+def api_get(path: str, params=None, fresh: bool = False):
+    # fresh=True skips the cached copy (but still refreshes it).
+    cache = content_cache()
+    key = content_key(path, params)
+    data = None if fresh else cache.get(key)
+    if data is None:
+        data = get_client().get(path, params=params)
+        cache.set(key, data)
+    return data
+
+MULTI_GET_CHUNK = 500
+
+
+def get_version(version_hash: str) -> dict:
+    """Published story snapshot {"story", "pages"}; immutable, so it is cached without expiry."""
+    cache = content_cache()
+    key = content_key(f"/versions/{version_hash}")
+    data = cache.get(key)
+    if data is None:
+        data = get_client().get(f"/versions/{version_hash}")
+        cache.set(key, data, timeout=None)
+    return data
+
+
+def _get_many(base: str, ids) -> dict:
+    # Per-id cache entries are shared with api_get(f"{base}/<id>"), so invalidation stays exact.
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    if not ids:
+        return {}
+    cache = content_cache()
+    keys = {content_key(f"{base}/{i}"): i for i in ids}
+    out = {keys[k]: v for k, v in cache.get_many(list(keys)).items()}
+    missing = [i for i in ids if i not in out]
+    for start in range(0, len(missing), MULTI_GET_CHUNK):
+        chunk = missing[start:start + MULTI_GET_CHUNK]
+        rows = get_client().get(base, params={"ids": ",".join(map(str, chunk))})
+        cache.set_many({content_key(f"{base}/{r['id']}"): r for r in rows})
+        out.update((r["id"], r) for r in rows)
+    return out
+
+
+def get_stories(ids) -> dict:
+    """{story_id: story} for the given ids; ids Flask does not know are left out."""
+    return _get_many("/stories", ids)
+
+
+def get_pages(ids) -> dict:
+    """{page_id: page with choices} for the given ids; ids Flask does not know are left out."""
+    return _get_many("/pages", ids)
+
 
-def api_get(path: str, params=None):
-    url = f"{settings.FLASK_API_BASE}{path}"
-    r = requests.get(url, params=params, headers=api_headers(), timeout=10)
-    r.raise_for_status()
-    return r.json()
+async def aapi_get(path: str, params=None, fresh: bool = False):
+    """api_get for async views; runs in a worker thread so several calls can be awaited concurrently."""
+    return await sync_to_async(api_get, thread_sensitive=False)(path, params=params, fresh=fresh)
 
 def api_post(path: str, payload: dict):
-    url = f"{settings.FLASK_API_BASE}{path}"
-    r = requests.post(url, json=payload, headers=api_headers(), timeout=10)
-    r.raise_for_status()
-    return r.json()
+    return get_client().post(path, payload)
 
 def api_put(path: str, payload: dict):
-    url = f"{settings.FLASK_API_BASE}{path}"
-    r = requests.put(url, json=payload, headers=api_headers(), timeout=10)
-    r.raise_for_status()
-    return r.json()
+    return get_client().put(path, payload)
 
 def api_delete(path: str):
-    url = f"{settings.FLASK_API_BASE}{path}"
-    r = requests.delete(url, headers=api_headers(), timeout=10)
-    r.raise_for_status()
-    return r.json()
-
-def parse_score_delta(choice_text: str) -> int:
-    m = SCORE_RE.search(choice_text or "")
-    if not m:
-        return 0
-    sign = 1 if m.group("sign") == "+" else -1
-    return sign * int(m.group("num"))
+    return get_client().delete(path)
@@ -0,0 +1,202 @@
+"""Write-behind store for plays in progress.
+
+A play's state (current page, score, path, last roll) lives in the cache alias
+settings.PLAY_SESSION_CACHE_ALIAS; moves and dice rolls only touch the cache. The PlaySession
+row is brought up to date in batches: after PLAY_SESSION_FLUSH_STEPS moves, by a per-process
+timer every PLAY_SESSION_FLUSH_SECONDS, and at interpreter exit. A crashed worker loses at most
+that window of progress, never a completed Play: completion reads the live state and records it
+in the same transaction that removes the session row.
+
+Write-behind needs a cache every worker shares. With a per-process backend (LocMemCache, the
+default, or DummyCache) each move is written through to the row instead and reads come from the
+row, so several workers never see each other's stale copies.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import PlaySession
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("current_page_id", "score", "path", "last_roll")
+
+_dirty = {}  # cache key -> (state, moves since last flush); states this process has not written yet
+_dirty_lock = threading.Lock()
+_flusher_pid = None
+
+
+def session_cache():
+    return caches[settings.PLAY_SESSION_CACHE_ALIAS]
+
+
+def write_behind() -> bool:
+    """Whether moves may be held in the cache; False when the cache is private to this process."""
+    return not isinstance(session_cache(), (LocMemCache, DummyCache))
+
+
+def _key(user_id: int, story_id: int) -> str:
+    return f"play:{user_id}:{story_id}"
+
+
+def _from_row(row: PlaySession) -> dict:
+    state = {f: getattr(row, f) for f in FIELDS}
+    state.update(id=row.pk, user_id=row.user_id, story_id=row.story_id, version_hash=row.version_hash, changed_at=row.updated_at)
+    return state
+
+
+def _forget(key: str):
+    with _dirty_lock:
+        _dirty.pop(key, None)
+    session_cache().delete(key)
+
+
+def load(user, story_id: int):
+    """Latest state of the user's play of a story as a dict, or None if there is no play.
+
+    The row is always checked: a play finished or restarted by another worker must not be resumed
+    from a cached copy."""
+    key = _key(user.pk, story_id)
+    row = PlaySession.objects.filter(user=user, story_id=story_id).first()
+    if row is None:
+        _forget(key)
+        return None
+    state = _from_row(row)
+    if not write_behind():
+        return state
+    with _dirty_lock:
+        local = _dirty.get(key)
+    cached = session_cache().get(key)
+    for candidate in (local[0] if local else None, cached):
+        # Only copies of this very row that are at least as new as it count.
+        if candidate is not None and candidate["id"] == row.pk and candidate["changed_at"] >= state["changed_at"]:
+            state = candidate
+    if cached is None:
+        session_cache().set(key, state)
+    return state
+
+
+def start(user, story_id: int, start_page_id: int, version_hash: str = "") -> dict:
+    """(Re)start a play pinned to a published version. Written through, so a session row exists
+    for every play in progress."""
+    row, _ = PlaySession.objects.update_or_create(
+        user=user, story_id=story_id,
+        defaults={"current_page_id": start_page_id, "score": 0, "path": [start_page_id], "last_roll": None,
+                  "version_hash": version_hash},
+    )
+    key = _key(user.pk, story_id)
+    with _dirty_lock:
+        _dirty.pop(key, None)
+    state = _from_row(row)
+    if write_behind():
+        session_cache().set(key, state)
+    return state
+
+
+def _store(state: dict, moves: int = 0) -> dict:
+    state["changed_at"] = timezone.now()
+    key = _key(state["user_id"], state["story_id"])
+    shared = write_behind()
+    if shared:
+        session_cache().set(key, state)
+    with _dirty_lock:
+        prev = _dirty.get(key)
+        pending = (prev[1] if prev else 0) + moves
+        _dirty[key] = (state, pending)
+    if not shared or pending >= settings.PLAY_SESSION_FLUSH_STEPS:
+        flush([key])
+    else:
+        _ensure_flusher()
+    return state
+
+
+def advance(state: dict, next_page_id: int, score_delta: int) -> dict:
+    """Record a move; returns the new state. The row is written by a later flush."""
+    return _store(dict(
+        state,
+        current_page_id=next_page_id,
+        score=state["score"] + score_delta,
+        path=(state["path"] or []) + [next_page_id],
+        last_roll=None,  # force reroll per page when using roll-gated choices
+    ), moves=1)
+
+
+def set_roll(state: dict, roll: int) -> dict:
+    return _store(dict(state, last_roll=roll))
+
+
+def finish(state: dict) -> bool:
+    """Drop a completed play. Call inside the transaction that records the Play, and record it only
+    if this returns True: False means another request already finished (or restarted) the play."""
+    key = _key(state["user_id"], state["story_id"])
+    deleted, _ = PlaySession.objects.filter(pk=state["id"]).delete()
+    with _dirty_lock:
+        _dirty.pop(key, None)
+    # Other workers' cached copies of the play die with the row: load() checks it first.
+    transaction.on_commit(lambda: session_cache().delete(key))
+    return bool(deleted)
+
+
+def flush(keys=None) -> int:
+    """Write this process's pending states (or just `keys`) to PlaySession in one transaction."""
+    with _dirty_lock:
+        batch = {k: _dirty[k][0] for k in (list(_dirty) if keys is None else keys) if k in _dirty}
+    if not batch:
+        return 0
+    latest = session_cache().get_many(list(batch))
+    written = 0
+    with transaction.atomic():
+        for key, local in batch.items():
+            state = latest.get(key)
+            if state is None or state["changed_at"] < local["changed_at"]:
+                state = local  # else another worker moved this play on since
+            # The updated_at guard keeps a late flush from overwriting a restart or a newer flush.
+            written += PlaySession.objects.filter(pk=state["id"], updated_at__lte=state["changed_at"]).update(
+                updated_at=state["changed_at"], **{f: state[f] for f in FIELDS}
+            )
+    with _dirty_lock:
+        for key, local in batch.items():
+            if key in _dirty and _dirty[key][0] is local:
+                del _dirty[key]
+    return written
+
+
+def _ensure_flusher():
+    # One timer thread per worker process (a thread started before a fork does not survive it).
+    global _flusher_pid
+    pid = os.getpid()
+    if _flusher_pid == pid:
+        return
+    with _dirty_lock:
+        if _flusher_pid == pid:
+            return
+        _flusher_pid = pid
+    threading.Thread(target=_flush_loop, name="play-session-flush", daemon=True).start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.PLAY_SESSION_FLUSH_SECONDS)
+        try:
+            flush()
+        except Exception:
+            logger.exception("Flushing play sessions failed; retrying on the next tick")
+        finally:
+            close_old_connections()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception("Flushing play sessions at exit failed")
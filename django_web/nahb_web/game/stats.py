@@ -0,0 +1,63 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Play, StoryPlayStat, EndingStat
+from .routes import index_play
+
+
+def bump_counters(model, lookup: dict, changes: dict):
+    """Add `changes` ({field: delta}) to the counters of the `model` row matching `lookup`,
+    creating the row with those values if it does not exist yet. Shared by the play and rating
+    rollups; call inside the transaction that records the change."""
+    # UPDATE first; the row only has to be created on its first change.
+    deltas = {k: F(k) + v for k, v in changes.items()}
+    if model.objects.filter(**lookup).update(**deltas):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **changes)
+    except IntegrityError:
+        # Another transaction created it first.
+        model.objects.filter(**lookup).update(**deltas)
+
+
+@transaction.atomic
+def record_play(user, story_id: int, ending_page_id: int, ending_label: str, score: int, path: list) -> Play:
+    """Create a Play and update the stats rollups and route index in the same transaction."""
+    play = Play.objects.create(
+        user=user,
+        story_id=story_id,
+        ending_page_id=ending_page_id,
+        ending_label=ending_label,
+        score=score,
+        path=path,
+    )
+    for scope in (user, None):
+        bump_counters(StoryPlayStat, {"user": scope, "story_id": story_id}, {"plays": 1})
+        bump_counters(EndingStat, {"user": scope, "story_id": story_id, "ending_label": ending_label}, {"plays": 1})
+    index_play(story_id, path)
+    return play
+
+
+@transaction.atomic
+def rebuild_play_stats(play_model=Play, story_stat_model=StoryPlayStat, ending_stat_model=EndingStat):
+    """Recompute every rollup row from the Play history.
+
+    The models can be swapped for historical ones, so migration 0002 backfills with this too.
+    """
+    story_stat_model.objects.all().delete()
+    ending_stat_model.objects.all().delete()
+    plays = play_model.objects
+    story_rows = []
+    for r in plays.values("user_id", "story_id").annotate(n=Count("id")).order_by():
+        story_rows.append(story_stat_model(user_id=r["user_id"], story_id=r["story_id"], plays=r["n"]))
+    for r in plays.values("story_id").annotate(n=Count("id")).order_by():
+        story_rows.append(story_stat_model(user_id=None, story_id=r["story_id"], plays=r["n"]))
+    ending_rows = []
+    for r in plays.values("user_id", "story_id", "ending_label").annotate(n=Count("id")).order_by():
+        ending_rows.append(ending_stat_model(user_id=r["user_id"], story_id=r["story_id"], ending_label=r["ending_label"], plays=r["n"]))
+    for r in plays.values("story_id", "ending_label").annotate(n=Count("id")).order_by():
+        ending_rows.append(ending_stat_model(user_id=None, story_id=r["story_id"], ending_label=r["ending_label"], plays=r["n"]))
+    story_stat_model.objects.bulk_create(story_rows, batch_size=1000)
+    ending_stat_model.objects.bulk_create(ending_rows, batch_size=1000)
+    return len(story_rows), len(ending_rows)
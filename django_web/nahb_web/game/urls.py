@@ -6,6 +6,7 @@ urlpatterns = [
     path("", views.story_list, name="story_list"),
     path("stories/<int:story_id>/", views.story_detail, name="story_detail"),
     path("stories/<int:story_id>/graph/", views.story_graph, name="story_graph"),
+    path("stories/<int:story_id>/routes/", views.story_routes, name="story_routes"),
 
     # auth
     path("register/", views.register, name="register"),
@@ -29,6 +30,7 @@ urlpatterns = [
     path("author/", views.author_dashboard, name="author_dashboard"),
     path("author/stories/new/", views.story_create, name="story_create"),
     path("author/stories/<int:story_id>/edit/", views.story_edit, name="story_edit"),
+    path("author/stories/<int:story_id>/batch/", views.story_batch_edit, name="story_batch_edit"),
     path("author/stories/<int:story_id>/delete/", views.story_delete, name="story_delete"),
     path("author/stories/<int:story_id>/pages/new/", views.page_create, name="page_create"),
     path("author/pages/<int:page_id>/edit/", views.page_edit, name="page_edit"),
@@ -1,18 +1,31 @@
+import asyncio
+import functools
 import json
 import random
+import requests
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.forms import UserCreationForm
-from django.db.models import Count, Avg
-from django.http import Http404, HttpResponseForbidden
-from django.shortcuts import render, redirect, get_object_or_404
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.urls import reverse
 from django.views.decorators.http import require_http_methods
 
-from .models import Play, PlaySession, StoryOwnership, Rating, Report
+from .models import Play, StoryOwnership, Rating, RatingSummary, Report, StoryPlayStat, EndingStat
 from .forms import StoryForm, PageForm, ChoiceForm, RatingForm, ReportForm
-from .services import api_get, api_post, api_put, api_delete, parse_score_delta
+from .services import api_get, aapi_get, get_stories, api_post, api_put, api_delete, invalidate_listings, invalidate_story, invalidate_changed_pages
+from .engine import get_published_graph, get_play_page, prefetch_published_graph
+from .stats import record_play
+from .ratings import save_rating
+from .routes import top_paths, dropoff_by_depth, page_reach
+from .analysis import story_report, get_story_report
+from .edits import form_fields, ops_from_post, new_page_keys, page_range, page_ranges
+from . import sessions as play_sessions
 
 
 def is_author(user):
@@ -29,35 +42,97 @@ def require_story_owner_or_admin(user, story_id: int) -> bool:
     return StoryOwnership.objects.filter(story_id=story_id, owner=user).exists()
 
 
+# -----------------------
+# Async view helpers: independent Flask calls and ORM queries are awaited together with
+# asyncio.gather (Flask calls run in worker threads, see services.aapi_get).
+# -----------------------
+def alogin_required(view):
+    # django.contrib.auth's login_required only wraps async views from Django 5.1 on.
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def _none():
+    return None
+
+
+# Rendering touches the session (messages) and request.user through context processors,
+# which are synchronous ORM work.
+arender = sync_to_async(render)
+
+
+PAGE_SIZE = 20
+
+
+def _after_cursor(request) -> int:
+    try:
+        return max(int(request.GET.get("after", 0)), 0)
+    except ValueError:
+        return 0
+
+
+def _story_page(after: int, **filters):
+    """One keyset page of /stories: (stories, next_after_id)."""
+    params = {"limit": PAGE_SIZE, **filters}
+    if after:
+        params["after_id"] = after
+    res = api_get("/stories", params=params)
+    return res["stories"], res["next_after_id"]
+
+
 def story_list(request):
     q = request.GET.get("q", "").strip()
-    stories = api_get("/stories", params={"status": "published"})
+    search = None
+    after, next_after = _after_cursor(request), None
     if q:
-        stories = [s for s in stories if q.lower() in (s.get("title","").lower() + " " + s.get("description","").lower())]
-    # attach rating aggregates from Django
-    ids = [s["id"] for s in stories]
-    rating_map = {r["story_id"]: r for r in Rating.objects.filter(story_id__in=ids).values("story_id").annotate(avg=Avg("stars"), count=Count("id"))}
+        try:
+            offset = max(int(request.GET.get("offset", 0)), 0)
+        except ValueError:
+            offset = 0
+        res = api_get("/stories/search", params={"q": q, "status": "published", "limit": PAGE_SIZE, "offset": offset})
+        stories = res["results"]
+        search = {
+            "total": res["total"],
+            "prev_offset": max(offset - PAGE_SIZE, 0) if offset else None,
+            "next_offset": offset + PAGE_SIZE if offset + PAGE_SIZE < res["total"] else None,
+        }
+    else:
+        stories, next_after = _story_page(after, status="published")
+    # attach rating aggregates from Django (RatingSummary rows, maintained by ratings.save_rating)
+    summaries = RatingSummary.objects.in_bulk([s["id"] for s in stories], field_name="story_id")
     for s in stories:
-        agg = rating_map.get(s["id"])
-        s["rating_avg"] = float(agg["avg"]) if agg and agg["avg"] is not None else None
-        s["rating_count"] = int(agg["count"]) if agg else 0
-    return render(request, "story_list.html", {"stories": stories, "q": q})
+        summary = summaries.get(s["id"])
+        s["rating_avg"] = summary.avg if summary else None
+        s["rating_count"] = summary.count if summary else 0
+    return render(request, "story_list.html", {
+        "stories": stories, "q": q, "search": search, "after": after, "next_after": next_after,
+    })
 
 
-def story_detail(request, story_id: int):
-    story = api_get(f"/stories/{story_id}")
-    if story.get("status") != "published" and not (request.user.is_authenticated and require_story_owner_or_admin(request.user, story_id)):
+async def story_detail(request, story_id: int):
+    user = await request.auser()
+    story, rating_summary, my_rating = await asyncio.gather(
+        aapi_get(f"/stories/{story_id}"),
+        RatingSummary.objects.filter(story_id=story_id).afirst(),
+        Rating.objects.filter(story_id=story_id, user=user).afirst() if user.is_authenticated else _none(),
+    )
+    if story.get("status") != "published" and not (
+        user.is_authenticated and await sync_to_async(require_story_owner_or_admin)(user, story_id)
+    ):
         raise Http404("Story not available")
+    if story.get("status") == "published":
+        prefetch_published_graph(story)  # Start is the likely next click
 
-    rating_agg = Rating.objects.filter(story_id=story_id).aggregate(avg=Avg("stars"), count=Count("id"))
-    my_rating = None
-    if request.user.is_authenticated:
-        my_rating = Rating.objects.filter(story_id=story_id, user=request.user).first()
-
-    return render(request, "story_detail.html", {
+    return await arender(request, "story_detail.html", {
         "story": story,
-        "rating_avg": rating_agg["avg"],
-        "rating_count": rating_agg["count"],
+        "rating_avg": rating_summary.avg if rating_summary else None,
+        "rating_count": rating_summary.count if rating_summary else 0,
+        "rating_histogram": rating_summary.histogram if rating_summary else [],
         "my_rating": my_rating,
     })
 
@@ -78,119 +153,102 @@ def play_start(request, story_id: int):
     story = api_get(f"/stories/{story_id}")
     if story.get("status") != "published":
         raise Http404("Story not published")
-    page = api_get(f"/stories/{story_id}/start")
+    # The play is pinned to the current published version; later edits do not reach it.
+    graph = get_published_graph(story)
+    if graph.page(graph.start_page_id) is None:
+        raise Http404("Story has no start page")
+    start_id = graph.start_page_id
 
-    sess, _ = PlaySession.objects.update_or_create(
-        user=request.user, story_id=story_id,
-        defaults={"current_page_id": page["id"], "score": 0, "path": [page["id"]], "last_roll": None},
-    )
-    return redirect("play_page", story_id=story_id, page_id=page["id"])
+    play_sessions.start(request.user, story_id, start_id, story.get("published_hash") or "")
+    return redirect("play_page", story_id=story_id, page_id=start_id)
 
 
 @login_required
 def play_resume(request, story_id: int):
-    sess = PlaySession.objects.filter(user=request.user, story_id=story_id).first()
+    sess = play_sessions.load(request.user, story_id)
     if not sess:
         return redirect("play_start", story_id=story_id)
-    return redirect("play_page", story_id=story_id, page_id=sess.current_page_id)
-
-
-def _choice_allowed_by_roll(choice_text: str, roll: int | None) -> bool:
-    # Optional mechanic: include tags like "[roll>=4]" anywhere in the choice text.
-    if roll is None:
-        # If the choice is gated, force a roll.
-        return "[roll>=" not in (choice_text or "").lower()
-    m = None
-    try:
-        m = __import__("re").search(r"\[roll\s*>=\s*(\d)\]", choice_text or "", flags=__import__("re").I)
-    except Exception:
-        m = None
-    if not m:
-        return True
-    need = int(m.group(1))
-    return roll >= need
+    return redirect("play_page", story_id=story_id, page_id=sess["current_page_id"])
 
 
 @login_required
 @require_http_methods(["GET","POST"])
 def play_page(request, story_id: int, page_id: int):
-    sess = PlaySession.objects.filter(user=request.user, story_id=story_id).first()
+    sess = play_sessions.load(request.user, story_id)
     if not sess:
         return redirect("play_start", story_id=story_id)
+    if page_id != sess["current_page_id"]:
+        # Stale tab, back button or replayed POST: only the current page can be played.
+        return redirect("play_page", story_id=story_id, page_id=sess["current_page_id"])
 
-    page = api_get(f"/pages/{page_id}")
+    version_hash = sess.get("version_hash", "")
+    graph, page = get_play_page(story_id, page_id, version_hash)
     # Optional dice roll action
     if request.method == "POST" and request.POST.get("action") == "roll":
-        sess.last_roll = random.randint(1, 6)
-        sess.save()
-        messages.info(request, f"You rolled a {sess.last_roll}.")
+        sess = play_sessions.set_roll(sess, random.randint(1, 6))
+        messages.info(request, f"You rolled a {sess['last_roll']}.")
         return redirect("play_page", story_id=story_id, page_id=page_id)
 
-    choices = page.get("choices", [])
-    choices = [c for c in choices if _choice_allowed_by_roll(c.get("text",""), sess.last_roll)]
+    choices = graph.available_choices(page_id, sess["last_roll"])
 
     if request.method == "POST" and request.POST.get("action") == "choose":
         choice_id = int(request.POST.get("choice_id"))
         chosen = next((c for c in choices if c["id"] == choice_id), None)
         if not chosen:
             raise Http404("Choice not found")
-        delta = parse_score_delta(chosen.get("text",""))
+        delta = chosen.get("score_delta", 0)
         next_page_id = int(chosen["next_page_id"])
 
-        # update autosave
-        sess.current_page_id = next_page_id
-        sess.score = sess.score + delta
-        sess.path = (sess.path or []) + [next_page_id]
-        sess.last_roll = None  # force reroll per page when using roll-gated choices
-        sess.save()
+        # update autosave (write-behind, see sessions.py)
+        sess = play_sessions.advance(sess, next_page_id, delta)
 
-        next_page = api_get(f"/pages/{next_page_id}")
+        graph, next_page = get_play_page(story_id, next_page_id, version_hash)
         if next_page.get("is_ending"):
-            # record play
-            Play.objects.create(
-                user=request.user,
-                story_id=story_id,
-                ending_page_id=next_page_id,
-                ending_label=next_page.get("ending_label") or "",
-                score=sess.score,
-                path=sess.path or [],
-            )
-            # clear session
-            sess.delete()
-            return render(request, "ending.html", {"story_id": story_id, "page": next_page, "score": sess.score})
+            # clear session + record play and rollups, once even if the ending is submitted twice
+            with transaction.atomic():
+                if play_sessions.finish(sess):
+                    record_play(
+                        request.user,
+                        story_id,
+                        ending_page_id=next_page_id,
+                        ending_label=next_page.get("ending_label") or "",
+                        score=sess["score"],
+                        path=sess["path"] or [],
+                    )
+            return render(request, "ending.html", {"story_id": story_id, "page": next_page, "score": sess["score"]})
 
         return redirect("play_page", story_id=story_id, page_id=next_page_id)
 
-    needs_roll = any("[roll>=" in (c.get("text","").lower()) for c in page.get("choices", []))
+    needs_roll = graph.needs_roll(page_id)
     return render(request, "play_page.html", {
         "story_id": story_id,
         "page": page,
         "choices": choices,
-        "score": sess.score,
-        "last_roll": sess.last_roll,
+        "score": sess["score"],
+        "last_roll": sess["last_roll"],
         "needs_roll": needs_roll,
     })
 
 
-@login_required
+@alogin_required
 @require_http_methods(["GET","POST"])
-def rate_story(request, story_id: int):
-    story = api_get(f"/stories/{story_id}")
+async def rate_story(request, story_id: int):
+    user = await request.auser()
+    story, existing = await asyncio.gather(
+        aapi_get(f"/stories/{story_id}"),
+        Rating.objects.filter(user=user, story_id=story_id).afirst(),
+    )
     if story.get("status") != "published":
         raise Http404("Story not published")
-    existing = Rating.objects.filter(user=request.user, story_id=story_id).first()
     form = RatingForm(request.POST or None, initial={
         "stars": existing.stars if existing else 5,
         "comment": existing.comment if existing else "",
     })
     if request.method == "POST" and form.is_valid():
-        Rating.objects.update_or_create(
-            user=request.user, story_id=story_id,
-            defaults={"stars": form.cleaned_data["stars"], "comment": form.cleaned_data["comment"]},
-        )
+        await sync_to_async(save_rating)(user, story_id, form.cleaned_data["stars"], form.cleaned_data["comment"])
         messages.success(request, "Rating saved.")
         return redirect("story_detail", story_id=story_id)
-    return render(request, "rate_story.html", {"story": story, "form": form})
+    return await arender(request, "rate_story.html", {"story": story, "form": form})
 
 
 @login_required
@@ -207,20 +265,22 @@ def report_story(request, story_id: int):
 
 @login_required
 def my_history(request):
-    plays = Play.objects.filter(user=request.user).order_by("-created_at")[:200]
+    plays = list(Play.objects.filter(user=request.user).order_by("-created_at")[:200])
+    stories = get_stories(p.story_id for p in plays)
+    for p in plays:
+        p.story = stories.get(p.story_id)
     return render(request, "my_history.html", {"plays": plays})
 
 
 def stats(request):
     # Readers: see their own play counts by story + endings distribution for their plays.
+    # Served from the rollup tables maintained by stats.record_play (user=None rows are global).
     if request.user.is_authenticated and not request.user.is_staff:
-        plays_per_story = (Play.objects.filter(user=request.user).values("story_id").annotate(count=Count("id")).order_by("-count"))
-        endings = (Play.objects.filter(user=request.user).values("story_id","ending_label").annotate(count=Count("id")).order_by("story_id","-count"))
-        scope = "Your stats"
+        owner, scope = request.user, "Your stats"
     else:
-        plays_per_story = (Play.objects.values("story_id").annotate(count=Count("id")).order_by("-count"))
-        endings = (Play.objects.values("story_id","ending_label").annotate(count=Count("id")).order_by("story_id","-count"))
-        scope = "Global stats"
+        owner, scope = None, "Global stats"
+    plays_per_story = StoryPlayStat.objects.filter(user=owner).values("story_id", count=F("plays")).order_by("-plays", "story_id")
+    endings = EndingStat.objects.filter(user=owner).values("story_id", "ending_label", count=F("plays")).order_by("story_id", "-plays")
     return render(request, "stats.html", {"plays_per_story": plays_per_story, "endings": endings, "scope": scope})
 
 
@@ -231,20 +291,32 @@ def stats(request):
 @user_passes_test(is_author)
 def author_dashboard(request):
     # show only owned stories (staff sees all)
-    stories = api_get("/stories")
-    if not request.user.is_staff:
-        owned_ids = set(StoryOwnership.objects.filter(owner=request.user).values_list("story_id", flat=True))
-        stories = [s for s in stories if s["id"] in owned_ids]
-    return render(request, "author_dashboard.html", {"stories": stories})
+    after = _after_cursor(request)
+    if request.user.is_staff:
+        stories, next_after = _story_page(after)
+    else:
+        # Page over the user's ownership rows, then fetch just that window from Flask.
+        owned_ids = list(
+            StoryOwnership.objects.filter(owner=request.user, story_id__gt=after)
+            .order_by("story_id").values_list("story_id", flat=True)[:PAGE_SIZE + 1]
+        )
+        window = owned_ids[:PAGE_SIZE]
+        found = get_stories(window)
+        stories = [found[i] for i in window if i in found]
+        next_after = window[-1] if len(owned_ids) > PAGE_SIZE else None
+    return render(request, "author_dashboard.html", {"stories": stories, "after": after, "next_after": next_after})
 
 
 @login_required
 @user_passes_test(is_author)
 @require_http_methods(["GET","POST"])
 def story_create(request):
-    form = StoryForm(request.POST or None, initial={"status":"draft"})
+    form = StoryForm(request.POST or None)
+    # A new story has no pages yet, so it starts as a draft; publishing goes through story_edit's graph check.
+    del form.fields["status"]
     if request.method == "POST" and form.is_valid():
-        s = api_post("/stories", form.cleaned_data)
+        s = api_post("/stories", dict(form.cleaned_data, status="draft"))
+        invalidate_listings()
         StoryOwnership.objects.get_or_create(story_id=s["id"], owner=request.user)
         return redirect("story_edit", story_id=s["id"])
     return render(request, "story_form.html", {"form": form, "mode": "create"})
@@ -256,14 +328,69 @@ def story_create(request):
 def story_edit(request, story_id: int):
     if not require_story_owner_or_admin(request.user, story_id):
         return HttpResponseForbidden("Not your story.")
-    story = api_get(f"/stories/{story_id}")
-    pages = api_get(f"/stories/{story_id}/pages")
+    # A save may publish, so the graph check must see the current content.
+    bundle = api_get(f"/stories/{story_id}/bundle", fresh=request.method == "POST")
+    story, pages = bundle["story"], bundle["pages"]
+    report = story_report(bundle)
     form = StoryForm(request.POST or None, initial=story)
     if request.method == "POST" and form.is_valid():
-        api_put(f"/stories/{story_id}", form.cleaned_data)
-        messages.success(request, "Story updated.")
+        republish = bool(request.POST.get("republish"))
+        # Only saves that (re)publish content are gated; metadata edits leave the published snapshot as is.
+        publishing = form.cleaned_data["status"] == "published" and (story["status"] != "published" or republish)
+        if publishing and not report["ok"]:
+            messages.error(request, "Cannot publish: fix the story graph first.")
+        else:
+            api_put(f"/stories/{story_id}", dict(form.cleaned_data, republish=republish))
+            invalidate_story(story_id)
+            messages.success(request, "Story updated.")
+            return redirect("story_edit", story_id=story_id)
+    return render(request, "story_edit.html", {"story": story, "form": form, "pages": pages, "report": report})
+
+
+@login_required
+@user_passes_test(is_author)
+@require_http_methods(["GET","POST"])
+def story_batch_edit(request, story_id: int):
+    # Edit one range of pages (and their choices) on one form, applied as one Flask transaction.
+    if not require_story_owner_or_admin(request.user, story_id):
+        return HttpResponseForbidden("Not your story.")
+    bundle = api_get(f"/stories/{story_id}/bundle", fresh=True)  # the version the edits are based on
+    story, all_pages = bundle["story"], bundle["pages"]
+    parts = page_ranges(all_pages)
+    try:
+        part = min(max(int(request.GET.get("part", 1)), 1), max(len(parts), 1))
+    except ValueError:
+        part = 1
+    pages = page_range(all_pages, part)
+    here = f"{reverse('story_batch_edit', args=[story_id])}?part={part}"
+    if request.method == "POST":
+        try:
+            version = int(request.POST.get("version", ""))
+            fields = form_fields(request.POST)
+        except ValueError:
+            return HttpResponseBadRequest("Malformed batch edit form.")
+        ops = ops_from_post(fields, story, pages)
+        if not ops:
+            messages.info(request, "Nothing to save.")
+            return redirect("story_edit", story_id=story_id)
+        try:
+            res = api_post(f"/stories/{story_id}/edits", {"expected_version": version, "ops": ops})
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code not in (400, 409):
+                raise
+            if e.response.status_code == 409:
+                messages.error(request, "The story was changed since you opened the editor; nothing was saved. Here is the current version.")
+            else:
+                messages.error(request, f"Nothing was saved: {e.response.json().get('error')}.")
+            return redirect(here)
+        invalidate_story(story_id, [p["id"] for p in all_pages])
+        invalidate_changed_pages(res.get("changed_pages", []))
+        messages.success(request, f"Applied {len(ops)} edits.")
         return redirect("story_edit", story_id=story_id)
-    return render(request, "story_edit.html", {"story": story, "form": form, "pages": pages})
+    return render(request, "story_batch_edit.html", {
+        "story": story, "pages": pages, "all_pages": all_pages, "version": bundle["version"],
+        "new_pages": new_page_keys(), "parts": parts, "part": part,
+    })
 
 
 @login_required
@@ -272,7 +399,9 @@ def story_edit(request, story_id: int):
 def story_delete(request, story_id: int):
     if not require_story_owner_or_admin(request.user, story_id):
         return HttpResponseForbidden("Not your story.")
-    api_delete(f"/stories/{story_id}")
+    res = api_delete(f"/stories/{story_id}")
+    invalidate_story(story_id, res.get("page_ids", []))
+    invalidate_changed_pages(res.get("changed_pages", []))
     StoryOwnership.objects.filter(story_id=story_id).delete()
     messages.success(request, "Story deleted.")
     return redirect("author_dashboard")
@@ -290,6 +419,7 @@ def page_create(request, story_id: int):
         p = api_post(f"/stories/{story_id}/pages", form.cleaned_data)
         if not story.get("start_page_id"):
             api_put(f"/stories/{story_id}", {"start_page_id": p["id"]})
+        invalidate_story(story_id)
         messages.success(request, "Page created.")
         return redirect("story_edit", story_id=story_id)
     return render(request, "page_form.html", {"story": story, "form": form})
@@ -305,6 +435,7 @@ def page_edit(request, page_id: int):
     form = PageForm(request.POST or None, initial=page)
     if request.method == "POST" and form.is_valid():
         api_put(f"/pages/{page_id}", form.cleaned_data)
+        invalidate_story(page["story_id"], [page_id])
         messages.success(request, "Page updated.")
         return redirect("story_edit", story_id=page["story_id"])
     return render(request, "page_edit.html", {"page": page, "form": form})
@@ -317,7 +448,9 @@ def page_delete(request, page_id: int):
     page = api_get(f"/pages/{page_id}")
     if not require_story_owner_or_admin(request.user, page["story_id"]):
         return HttpResponseForbidden("Not your story.")
-    api_delete(f"/pages/{page_id}")
+    res = api_delete(f"/pages/{page_id}")
+    # Pages that had choices into the deleted one changed too.
+    invalidate_changed_pages([{"id": page_id, "story_id": page["story_id"]}] + res.get("changed_pages", []))
     messages.success(request, "Page deleted.")
     return redirect("story_edit", story_id=page["story_id"])
 
@@ -332,6 +465,7 @@ def choice_create(request, page_id: int):
     form = ChoiceForm(request.POST or None)
     if request.method == "POST" and form.is_valid():
         api_post(f"/pages/{page_id}/choices", form.cleaned_data)
+        invalidate_story(page["story_id"], [page_id])
         messages.success(request, "Choice created.")
         return redirect("story_edit", story_id=page["story_id"])
     return render(request, "choice_form.html", {"page": page, "form": form})
@@ -343,7 +477,8 @@ def choice_create(request, page_id: int):
 def choice_delete(request, choice_id: int, story_id: int):
     if not require_story_owner_or_admin(request.user, story_id):
         return HttpResponseForbidden("Not your story.")
-    api_delete(f"/choices/{choice_id}")
+    res = api_delete(f"/choices/{choice_id}")
+    invalidate_story(story_id, [res["page_id"]] if res.get("page_id") else [])
     messages.success(request, "Choice deleted.")
     return redirect("story_edit", story_id=story_id)
 
@@ -354,9 +489,16 @@ def choice_delete(request, choice_id: int, story_id: int):
 @login_required
 @user_passes_test(is_admin)
 def moderation(request):
-    stories = api_get("/stories")
+    status = request.GET.get("status", "")
+    if status not in ("", "draft", "published", "suspended"):
+        status = ""
+    after = _after_cursor(request)
+    stories, next_after = _story_page(after, **({"status": status} if status else {}))
     reports = Report.objects.order_by("-created_at")[:200]
-    return render(request, "moderation.html", {"stories": stories, "reports": reports})
+    return render(request, "moderation.html", {
+        "stories": stories, "reports": reports, "status": status,
+        "after": after, "next_after": next_after, "pager_query": f"status={status}" if status else "",
+    })
 
 
 @login_required
@@ -366,7 +508,14 @@ def set_story_status(request, story_id: int):
     status = request.POST.get("status")
     if status not in ("draft", "published", "suspended"):
         raise Http404()
-    api_put(f"/stories/{story_id}", {"status": status})
+    if status == "published":
+        report = get_story_report(story_id)
+        if not report["ok"]:
+            messages.error(request, f"Story #{story_id} cannot be published: " + " ".join(report["errors"]))
+            return redirect("moderation")
+    # Publishing from moderation always publishes the current (just checked) content.
+    api_put(f"/stories/{story_id}", {"status": status, "republish": status == "published"})
+    invalidate_story(story_id)
     messages.success(request, f"Story status set to {status}.")
     return redirect("moderation")
 
@@ -386,25 +535,52 @@ def resolve_report(request, report_id: int):
 # Visualizations (Level 18+ quality)
 # -----------------------
 def story_graph(request, story_id: int):
-    story = api_get(f"/stories/{story_id}")
-    pages = api_get(f"/stories/{story_id}/pages")
+    bundle = api_get(f"/stories/{story_id}/bundle")
+    story, pages = bundle["story"], bundle["pages"]
+    report = story_report(bundle)
+    unreachable, stuck = set(report["unreachable"]), set(report["stuck"])
     nodes = []
     edges = []
     for p in pages:
         label = f"{p['id']}"
         if p.get("is_ending"):
             label += "\n(END)"
-        nodes.append({"id": p["id"], "label": label})
+        node = {"id": p["id"], "label": label}
+        if p["id"] in stuck:
+            node["color"] = "#fca5a5"
+        elif p["id"] in unreachable:
+            node["color"] = "#e5e7eb"
+        nodes.append(node)
         for c in p.get("choices", []):
             edges.append({"from": p["id"], "to": c["next_page_id"], "label": c.get("text","")[:28]})
-    return render(request, "story_graph.html", {"story": story, "nodes_json": json.dumps(nodes), "edges_json": json.dumps(edges)})
+    return render(request, "story_graph.html", {
+        "story": story, "nodes_json": json.dumps(nodes), "edges_json": json.dumps(edges),
+        "report": report if request.user.is_authenticated and require_story_owner_or_admin(request.user, story_id) else None,
+    })
 
 
 @login_required
-def play_path(request, play_id: int):
-    play = get_object_or_404(Play, id=play_id, user=request.user)
-    story = api_get(f"/stories/{play.story_id}")
-    pages = api_get(f"/stories/{play.story_id}/pages")
+def story_routes(request, story_id: int):
+    # Route analytics for authors/admins, answered from the RouteNode trie (no Play.path scans).
+    if not require_story_owner_or_admin(request.user, story_id):
+        return HttpResponseForbidden("Not your story.")
+    story = api_get(f"/stories/{story_id}")
+    reach = sorted(page_reach(story_id).items(), key=lambda kv: (-kv[1], kv[0]))
+    return render(request, "story_routes.html", {
+        "story": story,
+        "top_paths": top_paths(story_id),
+        "dropoff": dropoff_by_depth(story_id),
+        "reach": reach,
+    })
+
+
+@alogin_required
+async def play_path(request, play_id: int):
+    play = await aget_object_or_404(Play, id=play_id, user=await request.auser())
+    story, pages = await asyncio.gather(
+        aapi_get(f"/stories/{play.story_id}"),
+        aapi_get(f"/stories/{play.story_id}/pages"),
+    )
     path_set = set(play.path or [])
     nodes=[]
     edges=[]
@@ -412,7 +588,7 @@ def play_path(request, play_id: int):
         nodes.append({"id": p["id"], "label": str(p["id"]), "inPath": (p["id"] in path_set)})
         for c in p.get("choices", []):
             edges.append({"from": p["id"], "to": c["next_page_id"]})
-    return render(request, "play_path.html", {
+    return await arender(request, "play_path.html", {
         "story": story,
         "play": play,
         "nodes_json": json.dumps(nodes),
@@ -21,6 +21,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "nahb_web.game.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -49,11 +50,23 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "nahb_web.wsgi.application"
+ASGI_APPLICATION = "nahb_web.asgi.application"
+
+# Contention-safe SQLite for several workers (nahb_web/sqlite_backend): per-connection pragmas and
+# BEGIN IMMEDIATE transactions. SQLITE_PRODUCTION_MODE=0 falls back to the stock backend.
+SQLITE_PRODUCTION_MODE = os.getenv("SQLITE_PRODUCTION_MODE", "1") == "1"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",  # readers and the writer no longer block each other
+    f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+    f"PRAGMA synchronous = {os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')}",  # NORMAL is durable across app crashes in WAL mode
+]
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        "ENGINE": "nahb_web.sqlite_backend" if SQLITE_PRODUCTION_MODE else "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
     }
 }
 
@@ -71,6 +84,50 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Flask API config
 FLASK_API_BASE = os.getenv("FLASK_API_BASE", "http://localhost:5001").rstrip("/")
 FLASK_API_KEY = os.getenv("FLASK_API_KEY", "")
+FLASK_API_POOL_SIZE = int(os.getenv("FLASK_API_POOL_SIZE", "10"))
+FLASK_API_CONNECT_TIMEOUT = float(os.getenv("FLASK_API_CONNECT_TIMEOUT", "3.05"))
+FLASK_API_READ_TIMEOUT = float(os.getenv("FLASK_API_READ_TIMEOUT", "10"))
+FLASK_API_RETRIES = int(os.getenv("FLASK_API_RETRIES", "2"))  # GET only
+FLASK_API_RETRY_BACKOFF = float(os.getenv("FLASK_API_RETRY_BACKOFF", "0.2"))
+FLASK_API_VALIDATOR_CACHE_SIZE = int(os.getenv("FLASK_API_VALIDATOR_CACHE_SIZE", "512"))  # ETag'd GET bodies kept per process
+
+# Read-through cache for Flask content (game/services.py). LocMemCache is per process, so with
+# several workers point CONTENT_CACHE_BACKEND/LOCATION at a shared cache (Redis, Memcached).
+CONTENT_CACHE_ALIAS = "content"
+PLAY_SESSION_CACHE_ALIAS = "play"
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    CONTENT_CACHE_ALIAS: {
+        "BACKEND": os.getenv("CONTENT_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CONTENT_CACHE_LOCATION", "nahb-content"),
+        "TIMEOUT": int(os.getenv("CONTENT_CACHE_TTL", "300")),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CONTENT_CACHE_MAX_ENTRIES", "2000"))},
+    },
+    PLAY_SESSION_CACHE_ALIAS: {
+        "BACKEND": os.getenv("PLAY_SESSION_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("PLAY_SESSION_CACHE_LOCATION", "nahb-play"),
+        "TIMEOUT": int(os.getenv("PLAY_SESSION_CACHE_TTL", "3600")),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("PLAY_SESSION_CACHE_MAX_ENTRIES", "10000"))},
+    },
+}
+
+# Write-behind play sessions (game/sessions.py): moves are kept in the cache above and written to
+# PlaySession every PLAY_SESSION_FLUSH_STEPS moves or PLAY_SESSION_FLUSH_SECONDS, whichever is first.
+# Only a shared backend enables this; with a per-process one (LocMemCache) moves are written through.
+PLAY_SESSION_FLUSH_STEPS = int(os.getenv("PLAY_SESSION_FLUSH_STEPS", "5"))
+PLAY_SESSION_FLUSH_SECONDS = float(os.getenv("PLAY_SESSION_FLUSH_SECONDS", "10"))
+
+# Seconds a compiled story graph is trusted before the bundle is re-checked (game/engine.py)
+PLAY_GRAPH_TTL = float(os.getenv("PLAY_GRAPH_TTL", "30"))
+# Compiled graphs kept per worker process (live stories and published versions, LRU each)
+# and threads that fetch them in the background.
+PLAY_GRAPH_CACHE_SIZE = int(os.getenv("PLAY_GRAPH_CACHE_SIZE", "64"))
+PLAY_PREFETCH_WORKERS = int(os.getenv("PLAY_PREFETCH_WORKERS", "2"))
+
+# /metrics (Prometheus text format, game/metrics.py); when set, scrapers must send "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'story_list'
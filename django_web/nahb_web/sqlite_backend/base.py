@@ -0,0 +1,20 @@
+"""SQLite backend for several worker processes writing at once (settings.SQLITE_PRODUCTION_MODE).
+
+Every new connection gets settings.SQLITE_PRAGMAS (WAL, busy timeout, synchronous level), and
+atomic blocks start with BEGIN IMMEDIATE. A deferred BEGIN takes the write lock only at the first
+write, and if another connection committed in between SQLite fails at once with "database is
+locked" instead of waiting out the busy timeout; taking the lock up front makes writers queue.
+"""
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for pragma in settings.SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
@@ -1,6 +1,16 @@
+import hashlib
+import json
 import os
-from flask import Flask, jsonify, request, abort
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from flask import Flask, Response, g, has_request_context, jsonify, request, abort, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -21,8 +31,42 @@ def require_api_key():
         abort(401)
 
 
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Contention-safe SQLite for several workers; SQLITE_PRODUCTION_MODE=0 keeps the driver defaults.
+SQLITE_PRODUCTION_MODE = os.getenv("SQLITE_PRODUCTION_MODE", "1") == "1"
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",  # readers and the writer no longer block each other
+    f"PRAGMA busy_timeout = {int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))}",
+    f"PRAGMA synchronous = {os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')}",  # NORMAL is durable across app crashes in WAL mode
+]
+
+
+@event.listens_for(Engine, "connect")
+def sqlite_connect(dbapi_conn, connection_record):
+    if not SQLITE_PRODUCTION_MODE or not isinstance(dbapi_conn, sqlite3.Connection):
+        return
+    dbapi_conn.isolation_level = None  # the driver must not emit its own BEGIN; sqlite_begin does
+    for pragma in SQLITE_PRAGMAS:
+        dbapi_conn.execute(pragma)
+
+
+@event.listens_for(Engine, "begin")
+def sqlite_begin(conn):
+    if not SQLITE_PRODUCTION_MODE or conn.dialect.name != "sqlite":
+        return
+    # Writers take the lock up front: a deferred transaction that reads and then writes fails at once
+    # with "database is locked" if another writer committed in between, instead of waiting busy_timeout.
+    reading = has_request_context() and request.method in ("GET", "HEAD") and hasattr(init_db, "initialized")
+    conn.exec_driver_sql("BEGIN" if reading else "BEGIN IMMEDIATE")
+
+
 class Story(db.Model):
     __tablename__ = "stories"
+    # Indexes are declared here for db.create_all() and added to existing DBs by MIGRATIONS.
+    __table_args__ = (db.Index("ix_stories_status", "status", "id"),)
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, default="")
@@ -31,6 +75,11 @@ class Story(db.Model):
     )
     start_page_id = db.Column(db.Integer, db.ForeignKey("pages.id"), nullable=True)
     illustration_url = db.Column(db.String(500), nullable=True)
+    # Bumped on every write to the story, its pages or its choices; drives ETags and caches.
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utcnow)
+    # StoryVersion that readers play while the story is published (see sync_published).
+    published_hash = db.Column(db.String(64), nullable=True)
 
     pages = db.relationship(
         "Page", backref="story", lazy=True, foreign_keys="Page.story_id"
@@ -44,11 +93,14 @@ class Story(db.Model):
             "status": self.status,
             "start_page_id": self.start_page_id,
             "illustration_url": self.illustration_url,
+            "version": self.version,
+            "published_hash": self.published_hash,
         }
 
 
 class Page(db.Model):
     __tablename__ = "pages"
+    __table_args__ = (db.Index("ix_pages_story_id", "story_id", "id"),)
     id = db.Column(db.Integer, primary_key=True)
     story_id = db.Column(db.Integer, db.ForeignKey("stories.id"), nullable=False)
     text = db.Column(db.Text, nullable=False)
@@ -60,7 +112,8 @@ class Page(db.Model):
         "Choice", backref="page", lazy=True, foreign_keys="Choice.page_id"
     )
 
-    def to_dict(self, include_choices=False):
+    def to_dict(self, choices=None):
+        # choices: pre-loaded choice dicts (see choices_by_page); never walks the lazy relationship.
         data = {
             "id": self.id,
             "story_id": self.story_id,
@@ -69,17 +122,24 @@ class Page(db.Model):
             "ending_label": self.ending_label,
             "illustration_url": self.illustration_url,
         }
-        if include_choices:
-            data["choices"] = [c.to_dict() for c in self.choices]
+        if choices is not None:
+            data["choices"] = choices
         return data
 
 
 class Choice(db.Model):
     __tablename__ = "choices"
+    __table_args__ = (
+        db.Index("ix_choices_page_id", "page_id", "id"),
+        db.Index("ix_choices_next_page_id", "next_page_id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     page_id = db.Column(db.Integer, db.ForeignKey("pages.id"), nullable=False)
     text = db.Column(db.String(240), nullable=False)
     next_page_id = db.Column(db.Integer, db.ForeignKey("pages.id"), nullable=False)
+    # Mechanics compiled from the text by compile_choice_rules(); readers never parse the text.
+    score_delta = db.Column(db.Integer, nullable=False, default=0)
+    min_roll = db.Column(db.Integer, nullable=True)
 
     def to_dict(self):
         return {
@@ -87,9 +147,234 @@ class Choice(db.Model):
             "page_id": self.page_id,
             "text": self.text,
             "next_page_id": self.next_page_id,
+            "score_delta": self.score_delta,
+            "min_roll": self.min_roll,
         }
 
 
+class StoryVersion(db.Model):
+    """Immutable snapshot of a published story, addressed by the SHA-256 of its canonical JSON body."""
+    __tablename__ = "story_versions"
+    hash = db.Column(db.String(64), primary_key=True)
+    story_id = db.Column(db.Integer, nullable=False, index=True)
+    story_version = db.Column(db.Integer, nullable=False)  # Story.version the snapshot was taken from
+    body = db.Column(db.Text, nullable=False)  # {"story": {...}, "pages": [...]} as served by /versions/<hash>
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+
+SCORE_DELTA_RE = re.compile(r"\((?P<sign>[+-])(?P<num>\d+)\)")
+MIN_ROLL_RE = re.compile(r"\[roll\s*>=\s*(\d)\]", re.I)
+
+
+def compile_choice_rules(text: str) -> dict:
+    """Structured mechanics for a choice text: "(+2)" scores, "[roll>=4]" gates on a dice roll."""
+    m = SCORE_DELTA_RE.search(text or "")
+    score_delta = (1 if m.group("sign") == "+" else -1) * int(m.group("num")) if m else 0
+    m = MIN_ROLL_RE.search(text or "")
+    return {"score_delta": score_delta, "min_roll": int(m.group(1)) if m else None}
+
+
+def touch_story(story_id: int):
+    """Bump the content version of a story inside the current transaction."""
+    Story.query.filter_by(id=story_id).update(
+        {Story.version: Story.version + 1, Story.updated_at: utcnow()}, synchronize_session=False
+    )
+
+
+def not_modified(etag: str, last_modified=None):
+    """304 response when the request's validators still match, else None."""
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        fresh = last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    return with_validators(app.response_class(status=304), etag, last_modified)
+
+
+def with_validators(resp, etag: str, last_modified=None):
+    resp.set_etag(etag, weak=True)
+    if last_modified:
+        resp.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return resp
+
+
+def parse_id_list(raw, max_ids=1000):
+    """'1,2,3' -> [1, 2, 3]; None when the parameter is absent."""
+    if raw is None:
+        return None
+    try:
+        ids = [int(x) for x in raw.split(",") if x.strip()]
+    except ValueError:
+        abort(400, description="ids must be a comma-separated list of integers")
+    if len(ids) > max_ids:
+        abort(400, description=f"at most {max_ids} ids per request")
+    return ids
+
+
+def choices_by_page(*criteria):
+    """{page_id: [choice dicts]} for all choices matching criteria, loaded in a single query."""
+    by_page = {}
+    for c in Choice.query.filter(*criteria).order_by(Choice.id.asc()):
+        by_page.setdefault(c.page_id, []).append(c.to_dict())
+    return by_page
+
+
+def story_pages_with_choices(story_id: int):
+    # Two queries whatever the story size: one for pages, one for all of their choices.
+    pages = Page.query.filter_by(story_id=story_id).order_by(Page.id.asc()).all()
+    story_page_ids = db.select(Page.id).where(Page.story_id == story_id)
+    by_page = choices_by_page(Choice.page_id.in_(story_page_ids))
+    return [p.to_dict(choices=by_page.get(p.id, [])) for p in pages]
+
+
+def publish_snapshot(s: Story) -> str:
+    """Snapshot the story's current content into a StoryVersion and point published_hash at it.
+
+    Unchanged content hashes to the existing row, so republishing without edits adds nothing.
+    """
+    story = {k: v for k, v in s.to_dict().items() if k not in ("version", "published_hash")}
+    body = json.dumps({"story": story, "pages": story_pages_with_choices(s.id)}, sort_keys=True, separators=(",", ":"))
+    version_hash = hashlib.sha256(body.encode()).hexdigest()
+    if db.session.get(StoryVersion, version_hash) is None:
+        version = db.session.scalar(db.select(Story.version).where(Story.id == s.id))
+        db.session.add(StoryVersion(hash=version_hash, story_id=s.id, story_version=version, body=body))
+    s.published_hash = version_hash
+    return version_hash
+
+
+def sync_published(s: Story):
+    """Call after every write that sets a story's status: a published story is snapshotted, others are unpinned."""
+    if s.status == "published":
+        publish_snapshot(s)
+    else:
+        s.published_hash = None
+
+
+# -----------------------
+# Metrics: /metrics in the Prometheus text format, counted per process
+# -----------------------
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "").strip()
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+def _labels(names, values) -> str:
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, esc)) + "}"
+
+
+class Metric:
+    """Counter (buckets=None) or histogram keyed by label values."""
+
+    def __init__(self, name: str, help: str, labels, buckets=None):
+        self.name, self.help, self.labels, self.buckets = name, help, tuple(labels), buckets
+        self.values = {}
+        self.lock = threading.Lock()
+        METRICS.append(self)
+
+    def inc(self, labels, amount=1.0):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def observe(self, labels, value: float):
+        with self.lock:
+            v = self.values.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {'counter' if self.buckets is None else 'histogram'}"
+        with self.lock:
+            for key, v in sorted(self.values.items()):
+                if self.buckets is None:
+                    yield f"{self.name}{_labels(self.labels, key)} {v:g}"
+                    continue
+                for bound, n in zip(self.buckets + ("+Inf",), v[:-2] + [v[-1]]):
+                    le = bound if isinstance(bound, str) else f"{bound:g}"
+                    yield f"{self.name}_bucket{_labels(self.labels + ('le',), key + (le,))} {n}"
+                yield f"{self.name}_sum{_labels(self.labels, key)} {v[-2]:g}"
+                yield f"{self.name}_count{_labels(self.labels, key)} {v[-1]}"
+
+
+METRICS = []
+REQUESTS = Metric("nahb_api_requests_total", "Requests handled, by route and status.", ("route", "method", "status"))
+REQUEST_SECONDS = Metric("nahb_api_request_duration_seconds", "Request latency by route.", ("route", "method"), LATENCY_BUCKETS)
+REQUEST_QUERIES = Metric("nahb_api_db_queries_per_request", "SQL statements per request.", ("route",), QUERY_BUCKETS)
+DB_QUERIES = Metric("nahb_api_db_queries_total", "SQL statements executed, by route.", ("route",))
+DB_SECONDS = Metric("nahb_api_db_query_seconds_total", "Time spent in SQL, by route.", ("route",))
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    if has_request_context():
+        g.db_queries = g.get("db_queries", 0) + 1
+        g.db_seconds = g.get("db_seconds", 0.0) + elapsed
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(resp):
+    if "request_started" in g:
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        REQUESTS.inc((route, request.method, str(resp.status_code)))
+        REQUEST_SECONDS.observe((route, request.method), time.perf_counter() - g.request_started)
+        REQUEST_QUERIES.observe((route,), g.get("db_queries", 0))
+        DB_QUERIES.inc((route,), g.get("db_queries", 0))
+        DB_SECONDS.inc((route,), g.get("db_seconds", 0.0))
+    return resp
+
+
+@app.get("/metrics")
+def metrics():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        abort(403)
+    body = "\n".join(line for m in METRICS for line in m.render()) + "\n"
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def delete_pages(page_ids, exclude_story_id=None):
+    """Delete a set of pages with their outgoing and incoming choices in a few set-based statements.
+
+    page_ids is a list or a SELECT of page ids. Stories that lose pages or choices get their version bumped,
+    and a deleted start page is unset. Returns the surviving pages whose choices were removed,
+    as [{"id", "story_id"}], outside exclude_story_id (a story that is being deleted as well).
+    """
+    changed = db.session.execute(
+        db.select(Page.id, Page.story_id).distinct()
+        .join(Choice, Choice.page_id == Page.id)
+        .where(Choice.next_page_id.in_(page_ids), Page.id.not_in(page_ids))
+        .order_by(Page.id)
+    ).all()
+    touched = db.select(Page.story_id).where(Page.id.in_(page_ids)).distinct()
+    story_ids = set(db.session.scalars(touched)) | {story_id for _, story_id in changed}
+    story_ids.discard(exclude_story_id)
+    Choice.query.filter(db.or_(Choice.page_id.in_(page_ids), Choice.next_page_id.in_(page_ids))).delete(synchronize_session=False)
+    Story.query.filter(Story.start_page_id.in_(page_ids)).update({Story.start_page_id: None}, synchronize_session=False)
+    Page.query.filter(Page.id.in_(page_ids)).delete(synchronize_session=False)
+    if story_ids:
+        Story.query.filter(Story.id.in_(story_ids)).update(
+            {Story.version: Story.version + 1, Story.updated_at: utcnow()}, synchronize_session=False
+        )
+    return [{"id": page_id, "story_id": story_id} for page_id, story_id in changed if story_id != exclude_story_id]
+
+
 @app.get("/health")
 def health():
     return jsonify({"ok": True})
@@ -97,18 +382,93 @@ def health():
 
 @app.get("/stories")
 def list_stories():
+    # Optional keyset pagination: ?limit=N[&after_id=ID] returns {"stories": [...], "next_after_id": ...}.
+    # Without limit the full (filtered) list is returned as a plain array.
     status = request.args.get("status")
+    ids = parse_id_list(request.args.get("ids"))
+    limit = request.args.get("limit", type=int)
+    after_id = request.args.get("after_id", type=int)
     q = Story.query
     if status:
         q = q.filter_by(status=status)
-    stories = q.order_by(Story.id.asc()).all()
-    return jsonify([s.to_dict() for s in stories])
+    if ids is not None:
+        q = q.filter(Story.id.in_(ids))
+    if after_id:
+        q = q.filter(Story.id > after_id)
+    q = q.order_by(Story.id.asc())
+    if limit is not None:
+        limit = min(max(limit, 1), 200)
+        q = q.limit(limit + 1)
+    # Cheap fingerprint of the rows this response covers: any insert, delete or version bump changes it.
+    # ETag only: no date can say a story left the listing (deleted or unpublished), so a
+    # Last-Modified of max(updated_at) would answer If-Modified-Since with a stale 304.
+    window = q.with_entities(Story.id, Story.version, Story.updated_at).subquery()
+    fingerprint = db.session.query(
+        db.func.count(window.c.id), db.func.sum(window.c.id), db.func.sum(window.c.version), db.func.max(window.c.updated_at)
+    ).one()
+    etag = "stories-" + hashlib.sha1(repr((request.query_string, tuple(fingerprint))).encode()).hexdigest()[:20]
+    resp = not_modified(etag)
+    if resp:
+        return resp
+    stories = q.all()
+    if limit is None:
+        return with_validators(jsonify([s.to_dict() for s in stories]), etag)
+    page = stories[:limit]
+    body = {
+        "stories": [s.to_dict() for s in page],
+        "next_after_id": page[-1].id if len(stories) > limit else None,
+    }
+    return with_validators(jsonify(body), etag)
+
+
+@app.get("/stories/search")
+def search_stories():
+    # Ranked full-text search over story title/description and, unless pages=0, page text.
+    q = (request.args.get("q") or "").strip()
+    status = request.args.get("status") or None
+    include_pages = request.args.get("pages", "1") != "0"
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return jsonify({"results": [], "total": 0, "limit": limit, "offset": offset})
+
+    if SEARCH_INDEX_ENABLED:
+        match = " ".join(f'"{t}"*' for t in terms)
+        # bm25() is negative, lower is better; page hits are down-weighted against title/description hits.
+        hits = "SELECT rowid AS story_id, bm25(stories_fts, 10.0, 3.0) AS rank FROM stories_fts WHERE stories_fts MATCH :match"
+        if include_pages:
+            hits += (
+                " UNION ALL SELECT p.story_id, bm25(pages_fts) * 0.5 AS rank"
+                " FROM pages_fts JOIN pages p ON p.id = pages_fts.rowid WHERE pages_fts MATCH :match"
+            )
+        # MATERIALIZED: bm25() cannot be evaluated once SQLite flattens the CTE into the outer query.
+        ranked = (
+            f"WITH hits AS MATERIALIZED ({hits}) SELECT s.id AS id, MIN(h.rank) AS rank FROM hits h JOIN stories s ON s.id = h.story_id"
+            " WHERE (:status IS NULL OR s.status = :status) GROUP BY s.id"
+        )
+        params = {"match": match, "status": status}
+    else:
+        # SQLite without FTS5: unranked substring match on title/description.
+        like = " AND ".join(f"(title LIKE :t{i} OR description LIKE :t{i})" for i in range(len(terms)))
+        ranked = f"SELECT id, 0 AS rank FROM stories WHERE (:status IS NULL OR status = :status) AND {like}"
+        params = {"status": status, **{f"t{i}": f"%{t}%" for i, t in enumerate(terms)}}
+
+    total = db.session.execute(db.text(f"SELECT COUNT(*) FROM ({ranked})"), params).scalar()
+    rows = db.session.execute(
+        db.text(f"{ranked} ORDER BY rank, id LIMIT :limit OFFSET :offset"),
+        {**params, "limit": limit, "offset": offset},
+    ).all()
+    stories = {s.id: s for s in Story.query.filter(Story.id.in_([r.id for r in rows]))}
+    results = [dict(stories[r.id].to_dict(), rank=r.rank) for r in rows if r.id in stories]
+    return jsonify({"results": results, "total": total, "limit": limit, "offset": offset})
 
 
 @app.get("/stories/<int:story_id>")
 def get_story(story_id: int):
     s = Story.query.get_or_404(story_id)
-    return jsonify(s.to_dict())
+    etag = f"story-{s.id}-v{s.version}"
+    return not_modified(etag, s.updated_at) or with_validators(jsonify(s.to_dict()), etag, s.updated_at)
 
 
 @app.get("/stories/<int:story_id>/start")
@@ -117,20 +477,74 @@ def get_story_start(story_id: int):
     if not s.start_page_id:
         abort(404, description="Story has no start_page_id")
     p = Page.query.get_or_404(s.start_page_id)
-    return jsonify(p.to_dict(include_choices=True))
+    return jsonify(p.to_dict(choices=choices_by_page(Choice.page_id == p.id).get(p.id, [])))
 
 
 @app.get("/stories/<int:story_id>/pages")
 def list_story_pages(story_id: int):
-    Story.query.get_or_404(story_id)
-    pages = Page.query.filter_by(story_id=story_id).order_by(Page.id.asc()).all()
-    return jsonify([p.to_dict(include_choices=True) for p in pages])
+    s = Story.query.get_or_404(story_id)
+    etag = f"pages-{s.id}-v{s.version}"
+    resp = not_modified(etag, s.updated_at)
+    if resp:
+        return resp
+    return with_validators(jsonify(story_pages_with_choices(story_id)), etag, s.updated_at)
+
+
+@app.get("/stories/<int:story_id>/bundle")
+def get_story_bundle(story_id: int):
+    # Whole play graph in one response.
+    s = Story.query.get_or_404(story_id)
+    etag = f"bundle-{s.id}-v{s.version}"
+    resp = not_modified(etag, s.updated_at)
+    if resp:
+        return resp
+    bundle = {"story": s.to_dict(), "version": s.version, "pages": story_pages_with_choices(story_id)}
+    return with_validators(jsonify(bundle), etag, s.updated_at)
+
+
+@app.get("/versions/<string:version_hash>")
+def get_version(version_hash: str):
+    # A published snapshot never changes, so any cache may keep it forever.
+    v = db.session.get(StoryVersion, version_hash) or abort(404)
+    if request.if_none_match.contains(v.hash):
+        resp = app.response_class(status=304)
+    else:
+        resp = Response(v.body, mimetype="application/json")
+    resp.set_etag(v.hash)
+    resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp
+
+
+@app.get("/pages")
+def list_pages():
+    # Multi-get: /pages?ids=1,2,3 -> pages (with choices unless choices=0), one IN query each.
+    ids = parse_id_list(request.args.get("ids"))
+    if ids is None:
+        abort(400, description="ids is required")
+    pages = Page.query.filter(Page.id.in_(ids)).order_by(Page.id.asc()).all() if ids else []
+    if request.args.get("choices", "1") == "0":
+        return jsonify([p.to_dict() for p in pages])
+    by_page = choices_by_page(Choice.page_id.in_([p.id for p in pages])) if pages else {}
+    return jsonify([p.to_dict(choices=by_page.get(p.id, [])) for p in pages])
 
 
 @app.get("/pages/<int:page_id>")
 def get_page(page_id: int):
-    p = Page.query.get_or_404(page_id)
-    return jsonify(p.to_dict(include_choices=True))
+    row = (
+        db.session.query(Story.version, Story.updated_at)
+        .join(Page, Page.story_id == Story.id)
+        .filter(Page.id == page_id)
+        .first()
+    )
+    if row is None:
+        abort(404)
+    etag = f"page-{page_id}-v{row.version}"
+    resp = not_modified(etag, row.updated_at)
+    if resp:
+        return resp
+    p = db.session.get(Page, page_id)
+    data = p.to_dict(choices=choices_by_page(Choice.page_id == p.id).get(p.id, []))
+    return with_validators(jsonify(data), etag, row.updated_at)
 
 
 @app.post("/stories")
@@ -140,6 +554,9 @@ def create_story():
     title = (data.get("title") or "").strip()
     if not title:
         abort(400, description="title is required")
+    if data.get("status") == "published":
+        # Nothing to play yet: publish with PUT once the story has pages (or use /stories/import).
+        abort(400, description="a new story has no pages and cannot be created as published")
     s = Story(
         title=title,
         description=(data.get("description") or "").strip(),
@@ -148,6 +565,8 @@ def create_story():
         illustration_url=(data.get("illustration_url") or None),
     )
     db.session.add(s)
+    db.session.flush()
+    sync_published(s)
     db.session.commit()
     return jsonify(s.to_dict()), 201
 
@@ -157,9 +576,15 @@ def update_story(story_id: int):
     require_api_key()
     s = Story.query.get_or_404(story_id)
     data = request.get_json(force=True, silent=True) or {}
+    was = s.status
     for key in ("title", "description", "status", "start_page_id", "illustration_url"):
         if key in data:
             setattr(s, key, data[key])
+    touch_story(s.id)
+    if s.status != was or data.get("republish"):
+        # Only a status change or an explicit {"republish": true} moves readers onto the current
+        # content; other saves of a published story leave its snapshot alone.
+        sync_published(s)
     db.session.commit()
     return jsonify(s.to_dict())
 
@@ -168,13 +593,13 @@ def update_story(story_id: int):
 def delete_story(story_id: int):
     require_api_key()
     s = Story.query.get_or_404(story_id)
-    pages = Page.query.filter_by(story_id=s.id).all()
-    for p in pages:
-        Choice.query.filter_by(page_id=p.id).delete()
-        db.session.delete(p)
-    db.session.delete(s)
+    story_page_ids = db.select(Page.id).where(Page.story_id == s.id)
+    page_ids = db.session.scalars(story_page_ids.order_by(Page.id)).all()
+    changed = delete_pages(story_page_ids, exclude_story_id=s.id)
+    Story.query.filter_by(id=s.id).delete(synchronize_session=False)
+    StoryVersion.query.filter_by(story_id=s.id).delete(synchronize_session=False)
     db.session.commit()
-    return jsonify({"deleted": True})
+    return jsonify({"deleted": True, "page_ids": page_ids, "changed_pages": changed})
 
 
 @app.post("/stories/<int:story_id>/pages")
@@ -193,6 +618,7 @@ def create_page(story_id: int):
         illustration_url=(data.get("illustration_url") or None),
     )
     db.session.add(p)
+    touch_story(story_id)
     db.session.commit()
     return jsonify(p.to_dict()), 201
 
@@ -205,6 +631,7 @@ def update_page(page_id: int):
     for key in ("text", "is_ending", "ending_label", "illustration_url"):
         if key in data:
             setattr(p, key, data[key])
+    touch_story(p.story_id)
     db.session.commit()
     return jsonify(p.to_dict())
 
@@ -213,62 +640,519 @@ def update_page(page_id: int):
 def delete_page(page_id: int):
     require_api_key()
     p = Page.query.get_or_404(page_id)
-    Choice.query.filter_by(page_id=p.id).delete()
-    db.session.delete(p)
+    story_id = p.story_id
+    changed = delete_pages([p.id])
     db.session.commit()
-    return jsonify({"deleted": True})
+    return jsonify({"deleted": True, "page_id": page_id, "story_id": story_id, "changed_pages": changed})
 
 
 @app.post("/pages/<int:page_id>/choices")
 def create_choice(page_id: int):
     require_api_key()
-    Page.query.get_or_404(page_id)
+    p = Page.query.get_or_404(page_id)
     data = request.get_json(force=True, silent=True) or {}
     text = (data.get("text") or "").strip()
     next_page_id = data.get("next_page_id")
     if not text or not next_page_id:
         abort(400, description="text and next_page_id are required")
     Page.query.get_or_404(int(next_page_id))
-    c = Choice(page_id=page_id, text=text, next_page_id=int(next_page_id))
+    c = Choice(page_id=page_id, text=text, next_page_id=int(next_page_id), **compile_choice_rules(text))
     db.session.add(c)
+    touch_story(p.story_id)
     db.session.commit()
     return jsonify(c.to_dict()), 201
 
 
+def insert_pages(story_id: int, pages) -> list:
+    """Bulk-insert page dicts (see import_story_graph) into a story; returns their ids in order."""
+    rows = [
+        {
+            "story_id": story_id,
+            "text": p["text"].strip(),
+            "is_ending": bool(p.get("is_ending", False)),
+            "ending_label": (p.get("ending_label") or None),
+            "illustration_url": (p.get("illustration_url") or None),
+        }
+        for p in pages
+    ]
+    return db.session.scalars(db.insert(Page).returning(Page.id, sort_by_parameter_order=True), rows).all()
+
+
+def insert_choices(page_ids: dict, choices):
+    """Bulk-insert choice dicts whose page/next_page are keys of page_ids."""
+    db.session.execute(db.insert(Choice), [
+        {
+            "page_id": page_ids[str(c["page"])],
+            "next_page_id": page_ids[str(c["next_page"])],
+            "text": c["text"].strip(),
+            **compile_choice_rules(c["text"]),
+        }
+        for c in choices
+    ])
+
+
+def is_text(value) -> bool:
+    """A string with something other than whitespace in it."""
+    return isinstance(value, str) and bool(value.strip())
+
+
+def is_optional_str(value) -> bool:
+    return value is None or isinstance(value, str)
+
+
+def import_story_graph(data: dict):
+    """Insert a story with all of its pages and choices in one transaction.
+
+    data = {"story": {...}, "pages": [{"key": ..., "text": ..., ...}],
+            "choices": [{"page": key, "next_page": key, "text": ...}], "start_page": key}
+    Pages and choices are bulk-inserted; returns (story, {page key: page id}).
+    """
+    if not isinstance(data, dict):
+        abort(400, description="body must be a JSON object")
+    meta = data.get("story") or {}
+    pages = data.get("pages", [])
+    choices = data.get("choices", [])
+    if not isinstance(meta, dict) or not isinstance(pages, list) or not isinstance(choices, list):
+        abort(400, description="story must be an object, pages and choices lists")
+    if not all(isinstance(x, dict) for x in pages + choices):
+        abort(400, description="every page and choice must be an object")
+    if not is_text(meta.get("title")):
+        abort(400, description="story.title is required")
+    title = meta["title"].strip()
+    if not all(is_optional_str(meta.get(f)) for f in ("description", "status", "illustration_url")):
+        abort(400, description="story.description, status and illustration_url must be strings")
+    keys = [str(p.get("key") or "") for p in pages]
+    if not all(keys) or len(set(keys)) != len(keys):
+        abort(400, description="every page needs a unique key")
+    if not all(is_text(p.get("text")) for p in pages):
+        abort(400, description="every page needs text")
+    if not all(isinstance(p.get("is_ending", False), bool) and is_optional_str(p.get("ending_label"))
+               and is_optional_str(p.get("illustration_url")) for p in pages):
+        abort(400, description="page is_ending must be a boolean, ending_label and illustration_url strings")
+    known = set(keys)
+    for c in choices:
+        if not is_text(c.get("text")):
+            abort(400, description="every choice needs text")
+        if str(c.get("page")) not in known or str(c.get("next_page")) not in known:
+            abort(400, description="choice page/next_page must reference page keys")
+    start_key = str(data.get("start_page") or (keys[0] if keys else ""))
+    if keys and start_key not in known:
+        abort(400, description="start_page must reference a page key")
+
+    try:
+        s = Story(
+            title=title,
+            description=(meta.get("description") or "").strip(),
+            status=(meta.get("status") or "draft").strip(),
+            illustration_url=(meta.get("illustration_url") or None),
+        )
+        db.session.add(s)
+        db.session.flush()
+        page_ids = {}
+        if pages:
+            ids = insert_pages(s.id, pages)
+            page_ids = dict(zip(keys, ids))
+            s.start_page_id = page_ids[start_key]
+        if choices:
+            insert_choices(page_ids, choices)
+        sync_published(s)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return s, page_ids
+
+
+@app.post("/stories/import")
+def import_story():
+    require_api_key()
+    data = request.get_json(force=True, silent=True) or {}
+    s, page_ids = import_story_graph(data)
+    return jsonify({"story": s.to_dict(), "page_ids": page_ids}), 201
+
+
+# --- Batch graph edits --------------------------------------------------------------------------
+EDIT_OPS = ("create_page", "update_page", "delete_page", "create_choice", "update_choice", "delete_choice", "set_start")
+
+
+class GraphEditError(ValueError):
+    pass
+
+
+def apply_graph_edits(story_id: int, ops: list) -> dict:
+    """Validate and apply a batch of edits to one story inside the current transaction.
+
+    Ops: {"op": "create_page", "key", "text", ...}, {"op": "update_page", "id", "text"?, "is_ending"?, ...},
+    {"op": "delete_page", "id"}, {"op": "create_choice", "page", "next_page", "text"},
+    {"op": "update_choice", "id", "text"?, "next_page"?}, {"op": "delete_choice", "id"},
+    {"op": "set_start", "page"}. A page reference is the id of a page of the story or the key of a
+    page created by the batch. Everything is checked before the first write; then the ops are
+    applied as set-based statements, one per kind. Raises GraphEditError(message, op index).
+    """
+    for i, o in enumerate(ops):
+        if not isinstance(o, dict) or o.get("op") not in EDIT_OPS:
+            raise GraphEditError(f"op must be an object with op one of {', '.join(EDIT_OPS)}", i)
+
+    def ids_of(kind):
+        return {o.get("id") for o in ops if o["op"] == kind and isinstance(o.get("id"), int)}
+
+    refs = {r for o in ops for r in (o.get("page"), o.get("next_page")) if isinstance(r, int)}
+    page_ids = set(db.session.scalars(db.select(Page.id).where(
+        Page.story_id == story_id, Page.id.in_(refs | ids_of("update_page") | ids_of("delete_page"))
+    )))
+    choice_ids = set(db.session.scalars(db.select(Choice.id).join(Page, Page.id == Choice.page_id).where(
+        Page.story_id == story_id, Choice.id.in_(ids_of("update_choice") | ids_of("delete_choice"))
+    )))
+
+    new_pages = {}  # key -> create_page op
+    page_updates, page_deletes, choice_creates, choice_updates, choice_deletes = [], [], [], [], []
+    start = start_index = None
+    for i, o in enumerate(ops):
+        kind = o["op"]
+
+        def check_ref(ref):
+            if not (ref in page_ids or (isinstance(ref, str) and ref in new_pages)):
+                raise GraphEditError("page reference is neither a page of the story nor a key created earlier in the batch", i)
+            return ref
+
+        if "text" in o and not (isinstance(o["text"], str) and o["text"].strip()):
+            raise GraphEditError("text must be a non-empty string", i)
+        if "is_ending" in o and not isinstance(o["is_ending"], bool):
+            raise GraphEditError("is_ending must be true or false", i)
+        for f in ("ending_label", "illustration_url"):
+            if o.get(f) is not None and not isinstance(o[f], str):
+                raise GraphEditError(f"{f} must be a string or null", i)
+        if kind == "create_page":
+            key = o.get("key")
+            if not isinstance(key, str) or not key or key in new_pages:
+                raise GraphEditError("create_page needs a unique string key", i)
+            if "text" not in o:
+                raise GraphEditError("create_page needs text", i)
+            new_pages[key] = o
+        elif kind in ("update_page", "delete_page"):
+            if o.get("id") not in page_ids:
+                raise GraphEditError("id is not a page of the story", i)
+            if kind == "delete_page":
+                page_deletes.append(o["id"])
+            else:
+                row = {"id": o["id"]}
+                if "text" in o:
+                    row["text"] = o["text"].strip()
+                if "is_ending" in o:
+                    row["is_ending"] = o["is_ending"]
+                for f in ("ending_label", "illustration_url"):
+                    if f in o:
+                        row[f] = o[f] or None
+                page_updates.append(row)
+        elif kind == "create_choice":
+            if "text" not in o:
+                raise GraphEditError("create_choice needs text", i)
+            choice_creates.append((check_ref(o.get("page")), check_ref(o.get("next_page")), o["text"]))
+        elif kind in ("update_choice", "delete_choice"):
+            if o.get("id") not in choice_ids:
+                raise GraphEditError("id is not a choice of the story", i)
+            if kind == "delete_choice":
+                choice_deletes.append(o["id"])
+            else:
+                row = {"id": o["id"]}
+                if "text" in o:
+                    row.update(text=o["text"].strip(), **compile_choice_rules(o["text"]))
+                if "next_page" in o:
+                    row["next_page"] = check_ref(o["next_page"])
+                choice_updates.append(row)
+        else:
+            start, start_index = check_ref(o.get("page")), i
+    if start in page_deletes:
+        raise GraphEditError("set_start refers to a page the batch deletes", start_index)
+
+    created = dict(zip(new_pages, insert_pages(story_id, list(new_pages.values())))) if new_pages else {}
+
+    def resolve(ref):
+        return created[ref] if isinstance(ref, str) else ref
+
+    if page_updates:
+        db.session.execute(db.update(Page), page_updates)
+    if choice_creates:
+        db.session.execute(db.insert(Choice), [
+            {"page_id": resolve(p), "next_page_id": resolve(n), "text": text.strip(), **compile_choice_rules(text)}
+            for p, n, text in choice_creates
+        ])
+    for row in choice_updates:
+        if "next_page" in row:
+            row["next_page_id"] = resolve(row.pop("next_page"))
+    if choice_updates:
+        db.session.execute(db.update(Choice), choice_updates)
+    if choice_deletes:
+        Choice.query.filter(Choice.id.in_(choice_deletes)).delete(synchronize_session=False)
+    changed = delete_pages(page_deletes, exclude_story_id=story_id) if page_deletes else []
+    if start is not None:
+        Story.query.filter_by(id=story_id).update({Story.start_page_id: resolve(start)}, synchronize_session=False)
+    return {"page_ids": created, "deleted_page_ids": page_deletes, "changed_pages": changed}
+
+
+@app.post("/stories/<int:story_id>/edits")
+def edit_story_graph(story_id: int):
+    # {"expected_version": N, "ops": [...]} (see apply_graph_edits); all or nothing.
+    # 409 when the story's version is no longer expected_version, i.e. someone else edited it.
+    require_api_key()
+    Story.query.get_or_404(story_id)
+    data = request.get_json(force=True, silent=True) or {}
+    ops = data.get("ops")
+    if not isinstance(ops, list) or not ops or len(ops) > 5000:
+        abort(400, description="ops must be a list of 1 to 5000 edits")
+    expected = data.get("expected_version")
+    if expected is not None and (not isinstance(expected, int) or isinstance(expected, bool)):
+        abort(400, description="expected_version must be an integer")
+    # The version check and bump are one statement, so two concurrent batches cannot both pass it.
+    bump = db.update(Story).where(Story.id == story_id).values(version=Story.version + 1, updated_at=utcnow())
+    if expected is not None:
+        bump = bump.where(Story.version == expected)
+    try:
+        if db.session.execute(bump).rowcount == 0:
+            db.session.rollback()
+            return jsonify({"error": "version conflict", "version": db.session.get(Story, story_id).version}), 409
+        result = apply_graph_edits(story_id, ops)
+        db.session.commit()
+    except GraphEditError as e:
+        db.session.rollback()
+        message, index = e.args
+        return jsonify({"error": message, "op": index}), 400
+    except Exception:
+        db.session.rollback()
+        raise
+    s = db.session.get(Story, story_id)
+    db.session.refresh(s)
+    return jsonify({"story": s.to_dict(), **result})
+
+
+# --- NDJSON export / import ------------------------------------------------------------------
+# One JSON record per line, every story followed by its pages and then its choices:
+#   {"type": "story", "key": 7, "title": ..., "description": ..., "status": ..., "illustration_url": ..., "start_page": 12}
+#   {"type": "page", "story": 7, "key": 12, "text": ..., "is_ending": ..., "ending_label": ..., "illustration_url": ...}
+#   {"type": "choice", "story": 7, "page": 12, "next_page": 13, "text": ...}
+# Keys are the exporting DB's ids; an import assigns new ones. Both directions work in batches of
+# NDJSON_BATCH rows, so memory does not grow with the size of a story or of the catalogue.
+NDJSON_BATCH = 1000
+
+
+def export_records(story_ids_query):
+    """Yield the NDJSON records of every story id the select() matches, in keyset-paginated batches."""
+    after_id = 0
+    while True:
+        stories = db.session.execute(
+            db.select(Story.id, Story.title, Story.description, Story.status, Story.illustration_url, Story.start_page_id)
+            .where(Story.id.in_(story_ids_query), Story.id > after_id).order_by(Story.id).limit(100)
+        ).all()
+        if not stories:
+            return
+        for s in stories:
+            yield {"type": "story", "key": s.id, "title": s.title, "description": s.description or "",
+                   "status": s.status, "illustration_url": s.illustration_url, "start_page": s.start_page_id}
+            last = 0
+            while True:
+                pages = db.session.execute(
+                    db.select(Page.id, Page.text, Page.is_ending, Page.ending_label, Page.illustration_url)
+                    .where(Page.story_id == s.id, Page.id > last).order_by(Page.id).limit(NDJSON_BATCH)
+                ).all()
+                for p in pages:
+                    yield {"type": "page", "story": s.id, "key": p.id, "text": p.text, "is_ending": bool(p.is_ending),
+                           "ending_label": p.ending_label, "illustration_url": p.illustration_url}
+                if len(pages) < NDJSON_BATCH:
+                    break
+                last = pages[-1].id
+            # Choices leading out of the story cannot be re-linked on import and are left out.
+            story_pages = db.select(Page.id).where(Page.story_id == s.id)
+            last = 0
+            while True:
+                choices = db.session.execute(
+                    db.select(Choice.id, Choice.page_id, Choice.next_page_id, Choice.text)
+                    .where(Choice.page_id.in_(story_pages), Choice.next_page_id.in_(story_pages), Choice.id > last)
+                    .order_by(Choice.id).limit(NDJSON_BATCH)
+                ).all()
+                for c in choices:
+                    yield {"type": "choice", "story": s.id, "page": c.page_id, "next_page": c.next_page_id, "text": c.text}
+                if len(choices) < NDJSON_BATCH:
+                    break
+                last = choices[-1].id
+        after_id = stories[-1].id
+
+
+def ndjson_response(records, filename: str):
+    lines = (json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+    resp = Response(stream_with_context(lines), mimetype="application/x-ndjson")
+    resp.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return resp
+
+
+@app.get("/stories/export.ndjson")
+def export_stories():
+    # ?status=published and/or ?ids=1,2,3 narrow the export; without either every story is exported.
+    q = db.select(Story.id)
+    if request.args.get("status"):
+        q = q.where(Story.status == request.args["status"])
+    ids = parse_id_list(request.args.get("ids"))
+    if ids is not None:
+        q = q.where(Story.id.in_(ids))
+    return ndjson_response(export_records(q), "stories.ndjson")
+
+
+@app.get("/stories/<int:story_id>/export.ndjson")
+def export_story(story_id: int):
+    Story.query.get_or_404(story_id)
+    return ndjson_response(export_records(db.select(Story.id).where(Story.id == story_id)), f"story-{story_id}.ndjson")
+
+
+class NdjsonImportError(ValueError):
+    pass
+
+
+def import_ndjson(lines, imported: list):
+    """Import NDJSON records (see export_records) from an iterable of lines, one transaction per story.
+
+    Every imported story is appended to `imported` as {"key", "id", "pages", "choices"} once committed.
+    Raises NdjsonImportError(message, line number); the story being read at that point is rolled back.
+    """
+    story = None  # {"key", "id", "start_page", "page_ids": {key: id}, "pages", "choices"}
+    pages, choices = {}, []  # pending rows: {page key: record}, [record]
+
+    def flush_pages():
+        ids = insert_pages(story["id"], list(pages.values()))
+        story["page_ids"].update(zip(pages, ids))
+        story["pages"] += len(pages)
+        pages.clear()
+
+    def flush_choices():
+        insert_choices(story["page_ids"], choices)
+        story["choices"] += len(choices)
+        choices.clear()
+
+    def finish_story(lineno):
+        if pages:
+            flush_pages()
+        if choices:
+            flush_choices()
+        start = story["start_page"]
+        if start is not None and str(start) not in story["page_ids"]:
+            raise NdjsonImportError("start_page does not reference a page of the story", lineno)
+        start_page_id = story["page_ids"][str(start)] if start is not None else next(iter(story["page_ids"].values()), None)
+        s = db.session.get(Story, story["id"])
+        s.start_page_id = start_page_id
+        sync_published(s)
+        db.session.commit()
+        imported.append({k: story[k] for k in ("key", "id", "pages", "choices")})
+
+    lineno = 0
+    try:
+        for lineno, raw in enumerate(lines, 1):
+            if not raw.strip():
+                continue
+            try:
+                rec = json.loads(raw)
+            except ValueError:
+                raise NdjsonImportError("invalid JSON", lineno)
+            kind = rec.get("type") if isinstance(rec, dict) else None
+            if kind == "story":
+                if story is not None:
+                    finish_story(lineno - 1)
+                if not is_text(rec.get("title")):
+                    raise NdjsonImportError("story.title is required", lineno)
+                if not all(is_optional_str(rec.get(f)) for f in ("description", "status", "illustration_url")):
+                    raise NdjsonImportError("story.description, status and illustration_url must be strings", lineno)
+                s = Story(
+                    title=rec["title"].strip(),
+                    description=(rec.get("description") or "").strip(),
+                    status=(rec.get("status") or "draft").strip(),
+                    illustration_url=(rec.get("illustration_url") or None),
+                )
+                db.session.add(s)
+                db.session.flush()
+                story = {"key": rec.get("key"), "id": s.id, "start_page": rec.get("start_page"),
+                         "page_ids": {}, "pages": 0, "choices": 0}
+                db.session.expunge(s)  # keep the identity map empty however many stories follow
+            elif kind in ("page", "choice"):
+                if story is None or rec.get("story", story["key"]) != story["key"]:
+                    raise NdjsonImportError(f"{kind} record outside of its story", lineno)
+                if not is_text(rec.get("text")):
+                    raise NdjsonImportError(f"every {kind} needs text", lineno)
+                if kind == "page":
+                    if not (isinstance(rec.get("is_ending", False), bool) and is_optional_str(rec.get("ending_label"))
+                            and is_optional_str(rec.get("illustration_url"))):
+                        raise NdjsonImportError("page is_ending must be a boolean, ending_label and illustration_url strings", lineno)
+                    if choices:
+                        raise NdjsonImportError("pages must come before the choices of a story", lineno)
+                    key = str(rec.get("key") or "")
+                    if not key or key in story["page_ids"] or key in pages:
+                        raise NdjsonImportError("every page needs a unique key", lineno)
+                    pages[key] = rec
+                    if len(pages) >= NDJSON_BATCH:
+                        flush_pages()
+                else:
+                    if pages:
+                        flush_pages()
+                    if str(rec.get("page")) not in story["page_ids"] or str(rec.get("next_page")) not in story["page_ids"]:
+                        raise NdjsonImportError("choice page/next_page must reference page keys of the story", lineno)
+                    choices.append(rec)
+                    if len(choices) >= NDJSON_BATCH:
+                        flush_choices()
+            else:
+                raise NdjsonImportError("unknown record type", lineno)
+        if story is not None:
+            finish_story(lineno)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+@app.post("/stories/import.ndjson")
+def import_stories_ndjson():
+    # Streams the request body line by line; stories before a bad line stay imported.
+    require_api_key()
+    imported = []
+    lines = (raw.decode("utf-8") for raw in request.stream)
+    try:
+        import_ndjson(lines, imported)
+    except NdjsonImportError as e:
+        message, lineno = e.args
+        return jsonify({"error": message, "line": lineno, "imported": imported}), 400
+    return jsonify({"imported": imported}), 201
+
+
 @app.delete("/choices/<int:choice_id>")
 def delete_choice(choice_id: int):
     require_api_key()
     c = Choice.query.get_or_404(choice_id)
+    page_id = c.page_id
+    touch_story(c.page.story_id)
     db.session.delete(c)
     db.session.commit()
-    return jsonify({"deleted": True})
+    return jsonify({"deleted": True, "page_id": page_id})
 
 def storyseed():
     if Story.query.count() > 0:
         return
 
     # Story 1 - SCP Escape
+    # Built as an import graph (see import_story_graph) so the whole story is one transaction.
 
-    s = Story(
-        title="SCP-6767: The King in Yellow.",
-        description="A mysterious document causes a containment breach and anomalous radio transmissions at a remote Foundation site. The player takes on the role of a newly assigned staff member tasked with investigating and containing the anomaly, making critical decisions that lead to multiple possible endings.",
-        status="published",
-        illustration_url="https://picsum.photos/seed/scp6767/900/500",
-    )
-    db.session.add(s)
-    db.session.commit()
+    story = {
+        "title": "SCP-6767: The King in Yellow.",
+        "description": "A mysterious document causes a containment breach and anomalous radio transmissions at a remote Foundation site. The player takes on the role of a newly assigned staff member tasked with investigating and containing the anomaly, making critical decisions that lead to multiple possible endings.",
+        "status": "published",
+        "illustration_url": "https://picsum.photos/seed/scp6767/900/500",
+    }
+    pages = []
+    choices = []
 
     def add_page(text, is_ending=False, ending_label=None, illustration_url=None):
-        p = Page(
-            story_id=s.id,
-            text=text,
-            is_ending=is_ending,
-            ending_label=ending_label,
-            illustration_url=illustration_url,
-        )
-        db.session.add(p)
-        db.session.commit()
-        return p
+        key = f"p{len(pages)}"
+        pages.append({
+            "key": key,
+            "text": text,
+            "is_ending": is_ending,
+            "ending_label": ending_label,
+            "illustration_url": illustration_url,
+        })
+        return key
 
     p_start = add_page(
         "You have been ordered to assist in damage control and reconnaissance. "
@@ -366,13 +1250,8 @@ def storyseed():
         illustration_url="https://picsum.photos/seed/madness/800/450",
     )
 
-    s.start_page_id = p_start.id
-    db.session.commit()
-
     def add_choice(page, text, nxt):
-        c = Choice(page_id=page.id, text=text, next_page_id=nxt.id)
-        db.session.add(c)
-        db.session.commit()
+        choices.append({"page": page, "text": text, "next_page": nxt})
 
     add_choice(p_start, "Carefully secure the yellow script in an evidence sleeve and report its discovery to Site Command immediately (+1)", p_survivors)
     add_choice(p_start, "Ignore protocol for a moment and skim the script, trying to identify the anomaly yourself before anyone else arrives (-1)", p_logs)
@@ -395,11 +1274,171 @@ def storyseed():
     add_choice(p_king, "Reject the entity outright, refusing knowledge that comes from something so clearly inhuman (+1)", p_end_death,)
     add_choice(p_king, "Accept the offer and submit, desperate to understand what lies beyond human knowledge (+1)", p_end_king,)
 
+    import_story_graph({"story": story, "pages": pages, "choices": choices, "start_page": p_start})
+
+
+def add_column(table: str, name: str, ddl: str):
+    # db.create_all() never alters existing tables; DBs created by it may already have the column.
+    existing = {row[1] for row in db.session.execute(db.text(f"PRAGMA table_info({table})"))}
+    if name not in existing:
+        db.session.execute(db.text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+
+def backfill_choice_rules(batch_size: int = 1000):
+    """Recompile score_delta/min_roll for every existing choice; returns the number of choices."""
+    done, after = 0, 0
+    while True:
+        rows = db.session.execute(
+            db.select(Choice.id, Choice.text).where(Choice.id > after).order_by(Choice.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        db.session.execute(db.update(Choice), [{"id": cid, **compile_choice_rules(text)} for cid, text in rows])
+        done += len(rows)
+        after = rows[-1].id
+    # Bundles are validated by story version; bump it so cached copies pick up the new fields.
+    Story.query.update({Story.version: Story.version + 1, Story.updated_at: utcnow()}, synchronize_session=False)
+    return done
+
+
+def add_story_versions():
+    add_column("stories", "version", "INTEGER NOT NULL DEFAULT 1")
+    add_column("stories", "updated_at", "DATETIME")
+
+
+def add_choice_rules():
+    add_column("choices", "score_delta", "INTEGER NOT NULL DEFAULT 0")
+    add_column("choices", "min_roll", "INTEGER")
+    backfill_choice_rules()
+
+
+def add_published_versions():
+    StoryVersion.__table__.create(db.session.connection(), checkfirst=True)
+    add_column("stories", "published_hash", "VARCHAR(64)")
+    for s in Story.query.filter_by(status="published", published_hash=None).all():
+        publish_snapshot(s)
+
+
+SEARCH_INDEX_DDL = [
+    # External-content FTS5 tables: the text lives in stories/pages, triggers keep the index in sync.
+    "CREATE VIRTUAL TABLE IF NOT EXISTS stories_fts USING fts5(title, description, content='stories', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(text, content='pages', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    """CREATE TRIGGER IF NOT EXISTS stories_fts_ai AFTER INSERT ON stories BEGIN
+        INSERT INTO stories_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stories_fts_ad AFTER DELETE ON stories BEGIN
+        INSERT INTO stories_fts(stories_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS stories_fts_au AFTER UPDATE OF title, description ON stories BEGIN
+        INSERT INTO stories_fts(stories_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO stories_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS pages_fts_ai AFTER INSERT ON pages BEGIN
+        INSERT INTO pages_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS pages_fts_ad AFTER DELETE ON pages BEGIN
+        INSERT INTO pages_fts(pages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS pages_fts_au AFTER UPDATE OF text ON pages BEGIN
+        INSERT INTO pages_fts(pages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO pages_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    "INSERT INTO stories_fts(stories_fts) VALUES ('rebuild')",
+    "INSERT INTO pages_fts(pages_fts) VALUES ('rebuild')",
+]
+
+
+def add_search_index():
+    # FTS5 is a compile-time option of SQLite; without it the migration is recorded and search
+    # keeps using LIKE matching (see search_stories).
+    try:
+        with db.session.begin_nested():
+            for stmt in SEARCH_INDEX_DDL:
+                db.session.execute(db.text(stmt))
+    except OperationalError:
+        app.logger.warning("SQLite FTS5 unavailable; /stories/search falls back to LIKE matching")
+
+
+# (version, name, steps): a step is SQL or a callable. Append only; never edit an applied migration.
+MIGRATIONS = [
+    (1, "story_versions", [add_story_versions]),
+    (2, "choice_rules", [add_choice_rules]),
+    (3, "content_indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_pages_story_id ON pages (story_id, id)",
+        "CREATE INDEX IF NOT EXISTS ix_choices_page_id ON choices (page_id, id)",
+        "CREATE INDEX IF NOT EXISTS ix_choices_next_page_id ON choices (next_page_id)",
+        "CREATE INDEX IF NOT EXISTS ix_stories_status ON stories (status, id)",
+        "ANALYZE",
+    ]),
+    (4, "published_versions", [add_published_versions]),
+    (5, "search_index", [add_search_index]),
+]
+
+
+def migrate_db():
+    """Apply pending MIGRATIONS in order, each in its own transaction; returns the names applied."""
+    db.session.execute(db.text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at DATETIME NOT NULL)"
+    ))
+    db.session.commit()
+    applied = set(db.session.scalars(db.text("SELECT version FROM schema_migrations")))
+    done = []
+    for version, name, steps in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            for step in steps:
+                if callable(step):
+                    step()
+                else:
+                    db.session.execute(db.text(step))
+            db.session.execute(
+                db.text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": utcnow()},
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        app.logger.info("Applied content DB migration %s_%s", version, name)
+        done.append(f"{version}_{name}")
+    return done
+
+
+@app.cli.command("migrate")
+def migrate_command():
+    """Create missing tables and apply pending schema migrations."""
+    db.create_all()
+    done = migrate_db()
+    print("Applied: " + ", ".join(done) if done else "Schema is up to date.")
+
+
+@app.cli.command("backfill-choice-rules")
+def backfill_choice_rules_command():
+    """Recompile choice mechanics from their text (run after changing compile_choice_rules)."""
+    db.create_all()
+    migrate_db()
+    done = backfill_choice_rules()
+    db.session.commit()
+    print(f"Recompiled {done} choices.")
+
+
+SEARCH_INDEX_ENABLED = True
+
+
+def detect_search_index():
+    global SEARCH_INDEX_ENABLED
+    SEARCH_INDEX_ENABLED = db.session.execute(
+        db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stories_fts'")
+    ).first() is not None
+
 
 @app.before_request
 def init_db():
     if not hasattr(init_db, "initialized"):
         db.create_all()
+        migrate_db()
+        detect_search_index()
         storyseed()
         init_db.initialized = True
 
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def flask_app(tmp_path_factory):
+    # app reads DATABASE_URL at import time, so point it at a throwaway DB first.
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp_path_factory.mktemp('db')}/content.db"
+    os.environ["API_KEY"] = ""
+    import app as content_app
+
+    return content_app.app
+
+
+@pytest.fixture
+def content_app(flask_app):
+    """The app module itself (db, flags), imported only once flask_app has configured it."""
+    import app
+
+    return app
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+
+@pytest.fixture
+def import_story(client):
+    """Import a draft chain story of `pages` pages, each with two choices to the next; returns its id."""
+    def make(pages: int = 3) -> int:
+        data = {
+            "story": {"title": f"{pages} pages", "status": "draft"},
+            "pages": [{"key": str(i), "text": f"Page {i}", "is_ending": i == pages - 1} for i in range(pages)],
+            "choices": [
+                {"page": str(i), "next_page": str(i + 1), "text": f"Choice {k} ({'+' if k else '-'}1)"}
+                for i in range(pages - 1) for k in range(2)
+            ],
+        }
+        r = client.post("/stories/import", json=data)
+        assert r.status_code == 201, r.data
+        return r.get_json()["story"]["id"]
+
+    return make
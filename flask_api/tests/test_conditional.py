@@ -0,0 +1,26 @@
+def test_listing_sends_only_an_etag(client, import_story):
+    import_story(2)
+    r = client.get("/stories")
+    assert r.headers.get("ETag") and "Last-Modified" not in r.headers
+    assert client.get("/stories", headers={"If-None-Match": r.headers["ETag"]}).status_code == 304
+
+
+def test_deleting_a_story_changes_the_listing_validator(client, import_story):
+    sid = import_story(2)
+    first = client.get("/stories")
+    assert client.delete(f"/stories/{sid}").status_code == 200
+    again = client.get("/stories", headers={
+        "If-None-Match": first.headers["ETag"],
+        "If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT",
+    })
+    assert again.status_code == 200
+    assert sid not in [s["id"] for s in again.get_json()]
+    # If-Modified-Since alone cannot validate a listing, so it never yields a stale 304.
+    assert client.get("/stories", headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}).status_code == 200
+
+
+def test_single_story_keeps_last_modified(client, import_story):
+    sid = import_story(2)
+    r = client.get(f"/stories/{sid}")
+    assert r.headers.get("Last-Modified")
+    assert client.get(f"/stories/{sid}", headers={"If-Modified-Since": r.headers["Last-Modified"]}).status_code == 304
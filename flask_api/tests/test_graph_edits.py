@@ -0,0 +1,75 @@
+import pytest
+
+
+def bundle(client, story_id: int) -> dict:
+    return client.get(f"/stories/{story_id}/bundle").get_json()
+
+
+def post_edits(client, story_id: int, ops, **extra):
+    return client.post(f"/stories/{story_id}/edits", json={"ops": ops, **extra})
+
+
+def test_edits_apply_and_bump_version(client, import_story):
+    sid = import_story(3)
+    b = bundle(client, sid)
+    page = b["pages"][0]
+    r = post_edits(client, sid, [
+        {"op": "update_page", "id": page["id"], "text": "Edited", "is_ending": False},
+        {"op": "create_page", "key": "n", "text": "New"},
+        {"op": "create_choice", "page": page["id"], "next_page": "n", "text": "Go"},
+    ], expected_version=b["version"])
+    assert r.status_code == 200, r.data
+    after = bundle(client, sid)
+    assert after["version"] == b["version"] + 1
+    assert after["pages"][0]["text"] == "Edited" and len(after["pages"]) == 4
+
+
+def test_stale_version_conflicts_and_writes_nothing(client, import_story):
+    sid = import_story(3)
+    b = bundle(client, sid)
+    page = b["pages"][0]
+    assert post_edits(client, sid, [{"op": "update_page", "id": page["id"], "text": "First"}],
+                      expected_version=b["version"]).status_code == 200
+    r = post_edits(client, sid, [{"op": "update_page", "id": page["id"], "text": "Second"}],
+                   expected_version=b["version"])
+    assert r.status_code == 409
+    assert r.get_json() == {"error": "version conflict", "version": b["version"] + 1}
+    assert bundle(client, sid)["pages"][0]["text"] == "First"
+
+
+@pytest.mark.parametrize("expected", [[1], "1", 1.5, True, {}])
+def test_expected_version_must_be_an_integer(client, import_story, expected):
+    sid = import_story(2)
+    page = bundle(client, sid)["pages"][0]
+    r = post_edits(client, sid, [{"op": "update_page", "id": page["id"], "text": "x"}], expected_version=expected)
+    assert r.status_code == 400
+
+
+@pytest.mark.parametrize("ops, index", [
+    ([], None),
+    ("nope", None),
+    ([1], 0),
+    ([{"op": "explode"}], 0),
+    ([{"op": "update_page", "id": "PAGE", "is_ending": "false"}], 0),
+    ([{"op": "update_page", "id": "PAGE", "ending_label": 3}], 0),
+    ([{"op": "update_page", "id": "PAGE", "text": ""}], 0),
+    ([{"op": "update_page", "id": 10**9, "text": "x"}], 0),
+    ([{"op": "create_page", "key": "a", "text": "A"}, {"op": "create_page", "key": "a", "text": "B"}], 1),
+    ([{"op": "create_choice", "page": "PAGE", "next_page": "missing", "text": "x"}], 0),
+    ([{"op": "delete_page", "id": "PAGE"}, {"op": "set_start", "page": "PAGE"}], 1),
+])
+def test_rejected_ops_change_nothing(client, import_story, ops, index):
+    sid = import_story(2)
+    b = bundle(client, sid)
+    page_id = b["pages"][0]["id"]
+
+    def fill(v):
+        return page_id if v == "PAGE" else v
+
+    if isinstance(ops, list):
+        ops = [{k: fill(v) for k, v in o.items()} if isinstance(o, dict) else o for o in ops]
+    r = post_edits(client, sid, ops, expected_version=b["version"])
+    assert r.status_code == 400, r.data
+    if index is not None:
+        assert r.get_json()["op"] == index
+    assert bundle(client, sid) == b
@@ -0,0 +1,54 @@
+import pytest
+
+
+def valid_payload():
+    return {
+        "story": {"title": "Imported", "status": "draft"},
+        "pages": [{"key": "a", "text": "A"}, {"key": "b", "text": "B", "is_ending": True, "ending_label": "End"}],
+        "choices": [{"page": "a", "next_page": "b", "text": "Go"}],
+    }
+
+
+def test_import_creates_the_graph(client):
+    r = client.post("/stories/import", json=valid_payload())
+    assert r.status_code == 201, r.data
+    sid = r.get_json()["story"]["id"]
+    pages = client.get(f"/stories/{sid}/pages").get_json()
+    assert [p["text"] for p in pages] == ["A", "B"] and pages[0]["choices"][0]["text"] == "Go"
+
+
+def broken(path, value):
+    data = valid_payload()
+    target = data
+    for step in path[:-1]:
+        target = target[step]
+    target[path[-1]] = value
+    return data
+
+
+@pytest.mark.parametrize("data", [
+    [1, 2],
+    "story",
+    {"story": [], "pages": [], "choices": []},
+    {"story": {"title": "x"}, "pages": {}, "choices": []},
+    broken(("pages", 0), "a"),
+    broken(("choices", 0), 7),
+    broken(("story", "title"), 5),
+    broken(("story", "title"), ["x"]),
+    broken(("story", "title"), "   "),
+    broken(("story", "description"), 3),
+    broken(("story", "status"), ["published"]),
+    broken(("pages", 0, "text"), 1),
+    broken(("pages", 0, "text"), ["A"]),
+    broken(("pages", 1, "is_ending"), "false"),
+    broken(("pages", 1, "ending_label"), 2),
+    broken(("choices", 0, "text"), 3),
+    broken(("choices", 0, "text"), {"t": 1}),
+    broken(("choices", 0, "next_page"), "zzz"),
+    broken(("pages", 1, "key"), "a"),
+])
+def test_malformed_imports_are_rejected_with_400(client, data):
+    before = len(client.get("/stories?status=").get_json() or [])
+    r = client.post("/stories/import", json=data)
+    assert r.status_code == 400, r.data
+    assert len(client.get("/stories?status=").get_json() or []) == before
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+
+def post_ndjson(client, records):
+    body = "\n".join(r if isinstance(r, str) else json.dumps(r) for r in records) + "\n"
+    return client.post("/stories/import.ndjson", data=body, content_type="application/x-ndjson")
+
+
+def test_export_round_trips(client, import_story):
+    sid = import_story(4)
+    exported = client.get(f"/stories/{sid}/export.ndjson").get_data(as_text=True).splitlines()
+    r = post_ndjson(client, exported)
+    assert r.status_code == 201, r.data
+    (new,) = r.get_json()["imported"]
+    assert (new["pages"], new["choices"]) == (4, 6)
+    texts = lambda story_id: [p["text"] for p in client.get(f"/stories/{story_id}/pages").get_json()]
+    assert texts(new["id"]) == texts(sid)
+
+
+STORY = {"type": "story", "key": 1, "title": "T"}
+PAGE = {"type": "page", "story": 1, "key": 1, "text": "P"}
+CHOICE = {"type": "choice", "story": 1, "page": 1, "next_page": 1, "text": "C"}
+
+
+@pytest.mark.parametrize("bad, line", [
+    ("{not json", 3),
+    (dict(STORY, title=7), 2),
+    (dict(STORY, title=["T"]), 2),
+    (dict(STORY, description=1), 2),
+    (dict(PAGE, key=2, text=5), 3),
+    (dict(PAGE, key=2, text=["P"]), 3),
+    (dict(PAGE, key=2, is_ending="false"), 3),
+    (dict(CHOICE, text=3), 3),
+    ({"type": "chapter"}, 3),
+])
+def test_bad_lines_are_reported_with_their_number(client, bad, line):
+    records = [STORY, PAGE, bad] if line == 3 else [dict(STORY, key=0, title="Kept"), bad]
+    r = post_ndjson(client, records)
+    assert r.status_code == 400, r.data
+    body = r.get_json()
+    assert body["line"] == line
+    assert len(body["imported"]) == (0 if line == 3 else 1)
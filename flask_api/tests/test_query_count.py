@@ -0,0 +1,32 @@
+from sqlalchemy import event
+
+
+def count_queries(flask_app, client, url: str) -> int:
+    from app import db
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with flask_app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        r = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert r.status_code == 200, r.data
+    return len(statements)
+
+
+def test_story_reads_use_constant_query_count(flask_app, client, import_story):
+    client.get("/health")  # creates, migrates and seeds the DB outside the measurement
+    small, large = import_story(3), import_story(60)
+    for path in ("pages", "bundle"):
+        n_small = count_queries(flask_app, client, f"/stories/{small}/{path}")
+        n_large = count_queries(flask_app, client, f"/stories/{large}/{path}")
+        assert n_small == n_large, (path, n_small, n_large)
+
+    pages = client.get(f"/stories/{large}/pages").get_json()
+    assert len(pages) == 60 and sum(len(p["choices"]) for p in pages) == 118
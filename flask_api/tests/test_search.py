@@ -0,0 +1,26 @@
+def test_search_index_is_created_by_a_migration(flask_app, client, content_app):
+    client.get("/health")
+    with flask_app.app_context():
+        applied = dict(content_app.db.session.execute(content_app.db.text("SELECT version, name FROM schema_migrations")).all())
+    assert applied[5] == "search_index"
+    assert content_app.SEARCH_INDEX_ENABLED
+
+
+def test_search_finds_titles_and_page_text(client, import_story):
+    sid = import_story(3)
+    r = client.post("/stories/import", json={
+        "story": {"title": "Lighthouse keeper"},
+        "pages": [{"key": "a", "text": "The fog horn sounds over the harbour"}],
+    })
+    lid = r.get_json()["story"]["id"]
+    ids = lambda q, **args: [s["id"] for s in client.get("/stories/search", query_string={"q": q, **args}).get_json()["results"]]
+    assert ids("lighthouse") == [lid]
+    assert ids("harbour") == [lid] and ids("harbour", pages="0") == []
+    assert sid not in ids("lighthouse")
+
+
+def test_search_falls_back_to_like_without_fts5(client, content_app, monkeypatch):
+    client.post("/stories/import", json={"story": {"title": "Cartographer's dream"}, "pages": []})
+    monkeypatch.setattr(content_app, "SEARCH_INDEX_ENABLED", False)
+    results = client.get("/stories/search?q=cartographer").get_json()["results"]
+    assert [s["title"] for s in results] == ["Cartographer's dream"]